@@ -2,16 +2,52 @@
 Cloud Backup Module using JSONBin.io
 Free JSON storage service - no OAuth required, just an API key
 Free tier: 10,000 requests/month, 100KB per bin
-Uses zlib compression to fit larger databases
+Uses zstd compression (zlib fallback) to fit larger databases
 """
 import os
 import json
 import base64
 import zlib
 import hashlib
+import sqlite3
+import time
+import threading
+import queue
+import logging
+import logging.handlers
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 
+# orjson is much faster than stdlib json for the index files; fall back if missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstd compresses both faster and tighter than zlib; fall back if missing
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+# Queue-backed logger: log records are handed to a background listener thread,
+# so the synchronous stdout write never blocks the request thread. Lazy
+# %-formatting means messages are only built if actually emitted.
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    logger.setLevel(logging.INFO)
+    _log_listener = logging.handlers.QueueListener(
+        _log_queue, logging.StreamHandler()
+    )
+    _log_listener.start()
+
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -23,6 +59,29 @@ INDEX_FILE = os.path.join(SCRIPT_DIR, 'data/cloud_index.json')
 # JSONBin.io API
 JSONBIN_API_URL = 'https://api.jsonbin.io/v3'
 
+# Bound how long any single JSONBin call may hang
+REQUEST_TIMEOUT_SECONDS = 15
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request"""
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = REQUEST_TIMEOUT_SECONDS
+        return super().send(request, **kwargs)
+
+
+# Shared session so all JSONBin calls reuse one TCP+TLS connection (keep-alive)
+# and transient errors are retried with backoff
+_session = requests.Session()
+_session.mount('https://', _TimeoutHTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5,
+                      status_forcelist=[429, 500, 502, 503, 504])
+))
+
 # Global master index bin ID - maps spreadsheet_id to index_bin_id
 # This must be shared across all machines (set via JSONBIN_MASTER_INDEX_ID env var)
 MASTER_INDEX_BIN_ID_FILE = os.path.join(SCRIPT_DIR, 'data/master_index_bin_id.txt')
@@ -36,6 +95,16 @@ LEGACY_INDEX_BIN_ID_FILE = os.path.join(SCRIPT_DIR, 'data/cloud_index_bin_id.txt
 # Maximum number of backups to keep in cloud
 MAX_CLOUD_BACKUPS = 5
 
+# Short-lived in-memory cache of cloud index fetches, keyed by bin id.
+# Listing backups is read-heavy and the index only changes on upload/delete,
+# so within this window a listing is served without an HTTPS round-trip.
+INDEX_CACHE_TTL_SECONDS = 60
+_index_cache = {}  # bin_id -> (fetched_at, index)
+
+# zlib level for the non-zstd fallback. Level 6 compresses almost as well as
+# 9 at a fraction of the CPU time; override via env if needed.
+ZLIB_LEVEL = int(os.environ.get('JSONBIN_ZLIB_LEVEL', '6'))
+
 # Hardcoded fallback index bin ID for cross-machine sync
 # This is used when no local cache exists and no env var is set
 HARDCODED_INDEX_BIN_ID = '693bbf3a43b1c97be9e89bd6'
@@ -52,8 +121,11 @@ def _compute_db_hash():
         return hashlib.sha256(f.read()).hexdigest()
 
 
+@lru_cache(maxsize=1)
 def get_api_key():
-    """Get JSONBin API key from environment or file"""
+    """Get JSONBin API key from environment or file.
+    Cached - _get_headers calls this on every API request, and the key only
+    changes through save_api_key (which clears the cache)."""
     # Try environment variable first (for production/Render)
     key = os.environ.get('JSONBIN_API_KEY')
     if key:
@@ -66,7 +138,7 @@ def get_api_key():
                 data = json.load(f)
                 return data.get('api_key')
         except Exception as e:
-            print(f"Error loading cloud token: {e}")
+            logger.error("Error loading cloud token: %s", e)
 
     # Fallback to hardcoded API key
     return HARDCODED_API_KEY
@@ -75,8 +147,12 @@ def get_api_key():
 def save_api_key(api_key):
     """Save API key to file for local development"""
     os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
-    with open(TOKEN_FILE, 'w') as f:
+    # Write to a temp file and rename - atomic, so a crash can't corrupt it
+    tmp_path = TOKEN_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
         json.dump({'api_key': api_key}, f)
+    os.replace(tmp_path, TOKEN_FILE)
+    get_api_key.cache_clear()
 
 
 def is_cloud_configured():
@@ -84,6 +160,19 @@ def is_cloud_configured():
     return get_api_key() is not None
 
 
+def _parse_json_response(response):
+    """Parse an HTTP response body, with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def _json_body(obj):
+    """Serialize a request body, with orjson when available.
+    Used with data= so requests skips its internal stdlib-json encoder."""
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode('utf-8')
+
+
 def _get_headers():
     """Get authorization headers for JSONBin API"""
     api_key = get_api_key()
@@ -93,8 +182,9 @@ def _get_headers():
     }
 
 
+@lru_cache(maxsize=1)
 def _get_master_index_bin_id():
-    """Get the global master index bin ID from env or file"""
+    """Get the global master index bin ID from env or file (cached)"""
     # Try environment variable first (required for cross-machine sync)
     bin_id = os.environ.get('JSONBIN_MASTER_INDEX_ID')
     if bin_id:
@@ -116,14 +206,16 @@ def _save_master_index_bin_id(bin_id):
     os.makedirs(os.path.dirname(MASTER_INDEX_BIN_ID_FILE), exist_ok=True)
     with open(MASTER_INDEX_BIN_ID_FILE, 'w') as f:
         f.write(bin_id)
+    _get_master_index_bin_id.cache_clear()
 
 
 def _load_index_bin_cache():
     """Load local cache of spreadsheet_id -> index_bin_id mappings"""
     if os.path.exists(INDEX_BIN_CACHE_FILE):
         try:
-            with open(INDEX_BIN_CACHE_FILE, 'r') as f:
-                return json.load(f)
+            with open(INDEX_BIN_CACHE_FILE, 'rb') as f:
+                raw = f.read()
+            return orjson.loads(raw) if orjson is not None else json.loads(raw)
         except:
             pass
     return {}
@@ -132,8 +224,13 @@ def _load_index_bin_cache():
 def _save_index_bin_cache(cache):
     """Save local cache of spreadsheet_id -> index_bin_id mappings"""
     os.makedirs(os.path.dirname(INDEX_BIN_CACHE_FILE), exist_ok=True)
-    with open(INDEX_BIN_CACHE_FILE, 'w') as f:
-        json.dump(cache, f, indent=2)
+    # Compact output (no indent) - faster to write and to load back
+    data = orjson.dumps(cache) if orjson is not None else json.dumps(cache).encode('utf-8')
+    # Write to a temp file and rename - atomic, so a crash can't corrupt it
+    tmp_path = INDEX_BIN_CACHE_FILE + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, INDEX_BIN_CACHE_FILE)
 
 
 def _load_master_index():
@@ -144,13 +241,13 @@ def _load_master_index():
 
     try:
         headers = _get_headers()
-        response = requests.get(
+        response = _session.get(
             f'{JSONBIN_API_URL}/b/{master_bin_id}/latest',
             headers=headers
         )
 
         if response.status_code == 200:
-            result = response.json()
+            result = _parse_json_response(response)
             return result.get('record', {'spreadsheets': {}})
         else:
             return {'spreadsheets': {}}
@@ -165,27 +262,27 @@ def _save_master_index(master_index):
 
     if master_bin_id:
         # Update existing master index bin
-        response = requests.put(
+        response = _session.put(
             f'{JSONBIN_API_URL}/b/{master_bin_id}',
             headers=headers,
-            json=master_index
+            data=_json_body(master_index)
         )
         return response.status_code == 200
     else:
         # Create new master index bin
         headers['X-Bin-Name'] = 'attendance_master_index'
-        response = requests.post(
+        response = _session.post(
             f'{JSONBIN_API_URL}/b',
             headers=headers,
-            json=master_index
+            data=_json_body(master_index)
         )
         if response.status_code in [200, 201]:
-            result = response.json()
+            result = _parse_json_response(response)
             new_bin_id = result.get('metadata', {}).get('id')
             if new_bin_id:
                 _save_master_index_bin_id(new_bin_id)
-                print(f"Created new master index bin: {new_bin_id}")
-                print(f"IMPORTANT: Set JSONBIN_MASTER_INDEX_ID={new_bin_id} on all machines!")
+                logger.info("Created new master index bin: %s", new_bin_id)
+                logger.info("IMPORTANT: Set JSONBIN_MASTER_INDEX_ID=%s on all machines!", new_bin_id)
                 return True
         return False
 
@@ -212,7 +309,7 @@ def _get_index_bin_id_for_spreadsheet(spreadsheet_id):
     # This allows Render to directly access the index bin without needing the master index
     direct_index_bin_id = os.environ.get('JSONBIN_INDEX_BIN_ID')
     if direct_index_bin_id:
-        print(f"Using direct index bin ID from env: {direct_index_bin_id[:8]}...")
+        logger.info("Using direct index bin ID from env: %s...", direct_index_bin_id[:8])
         # Cache it locally
         cache[spreadsheet_id] = direct_index_bin_id
         _save_index_bin_cache(cache)
@@ -231,7 +328,7 @@ def _get_index_bin_id_for_spreadsheet(spreadsheet_id):
             # Cache it locally
             cache[spreadsheet_id] = index_bin_id
             _save_index_bin_cache(cache)
-            print(f"Using legacy index bin {legacy_id} for spreadsheet {spreadsheet_id[:8]}")
+            logger.info("Using legacy index bin %s for spreadsheet %s", legacy_id, spreadsheet_id[:8])
 
     # Cache locally if found
     if index_bin_id and spreadsheet_id not in cache:
@@ -261,13 +358,13 @@ def _load_cloud_index_for_spreadsheet(spreadsheet_id):
 
     try:
         headers = _get_headers()
-        response = requests.get(
+        response = _session.get(
             f'{JSONBIN_API_URL}/b/{index_bin_id}/latest',
             headers=headers
         )
 
         if response.status_code == 200:
-            result = response.json()
+            result = _parse_json_response(response)
             index = result.get('record', {'backups': []})
             index['spreadsheet_id'] = spreadsheet_id
             return index
@@ -284,27 +381,27 @@ def _save_cloud_index_for_spreadsheet(spreadsheet_id, index):
 
     if index_bin_id:
         # Update existing index bin
-        response = requests.put(
+        response = _session.put(
             f'{JSONBIN_API_URL}/b/{index_bin_id}',
             headers=headers,
-            json=index
+            data=_json_body(index)
         )
         return response.status_code == 200
     else:
         # Create new index bin for this spreadsheet
         headers['X-Bin-Name'] = f'attendance_index_{spreadsheet_id[:8]}'
-        response = requests.post(
+        response = _session.post(
             f'{JSONBIN_API_URL}/b',
             headers=headers,
-            json=index
+            data=_json_body(index)
         )
         if response.status_code in [200, 201]:
-            result = response.json()
+            result = _parse_json_response(response)
             new_bin_id = result.get('metadata', {}).get('id')
             if new_bin_id:
                 # Register this index bin in the master index
                 _register_index_bin_for_spreadsheet(spreadsheet_id, new_bin_id)
-                print(f"Created new index bin for spreadsheet {spreadsheet_id[:8]}: {new_bin_id}")
+                logger.info("Created new index bin for spreadsheet %s: %s", spreadsheet_id[:8], new_bin_id)
                 return True
         return False
 
@@ -321,16 +418,22 @@ def _load_backup_index_for_spreadsheet(spreadsheet_id):
 
 def _load_cloud_index_direct(index_bin_id):
     """Load a cloud index directly by bin ID (for use when spreadsheet_id is unknown)"""
+    cached = _index_cache.get(index_bin_id)
+    if cached and time.time() - cached[0] < INDEX_CACHE_TTL_SECONDS:
+        return cached[1]
+
     try:
         headers = _get_headers()
-        response = requests.get(
+        response = _session.get(
             f'{JSONBIN_API_URL}/b/{index_bin_id}/latest',
             headers=headers
         )
 
         if response.status_code == 200:
-            result = response.json()
-            return result.get('record', {'backups': []})
+            result = _parse_json_response(response)
+            index = result.get('record', {'backups': []})
+            _index_cache[index_bin_id] = (time.time(), index)
+            return index
         else:
             return {'backups': []}
     except:
@@ -370,7 +473,7 @@ def _cleanup_old_backups(index):
         return index
 
     # Sort by timestamp descending (newest first)
-    backups.sort(key=lambda x: x['timestamp'], reverse=True)
+    backups.sort(key=itemgetter('timestamp'), reverse=True)
 
     # Get today's date
     today = datetime.now().strftime('%Y-%m-%d')
@@ -392,7 +495,7 @@ def _cleanup_old_backups(index):
     for i, date in enumerate(sorted_dates):
         day_backups = by_date[date]
         # Sort day's backups by timestamp descending
-        day_backups.sort(key=lambda x: x['timestamp'], reverse=True)
+        day_backups.sort(key=itemgetter('timestamp'), reverse=True)
 
         if date == today:
             # Today: keep last 3 backups
@@ -428,53 +531,103 @@ def _cleanup_old_backups(index):
     headers = _get_headers()
     for backup in backups_to_delete:
         try:
-            requests.delete(
+            _session.delete(
                 f'{JSONBIN_API_URL}/b/{backup["id"]}',
                 headers=headers
             )
-            print(f"Deleted old backup: {backup['name']}")
+            logger.info("Deleted old backup: %s", backup['name'])
         except Exception as e:
-            print(f"Failed to delete backup {backup['id']}: {e}")
+            logger.error("Failed to delete backup %s: %s", backup['id'], e)
 
+    # Keep the index sorted newest-first so readers can skip re-sorting
+    backups_to_keep.sort(key=itemgetter('timestamp'), reverse=True)
     index['backups'] = backups_to_keep
+
+    # Maintain secondary indexes so filtered listings are a dict lookup
+    # instead of scanning every backup's embedded sheet list
+    by_sheet = {}
+    by_spreadsheet = {}
+    for backup in backups_to_keep:
+        for sheet in backup.get('sheets', []):
+            if sheet.get('id') is not None:
+                by_sheet.setdefault(str(sheet['id']), []).append(backup['id'])
+            if sheet.get('spreadsheet_id'):
+                by_spreadsheet.setdefault(sheet['spreadsheet_id'], []).append(backup['id'])
+    index['by_sheet'] = by_sheet
+    index['by_spreadsheet'] = by_spreadsheet
     return index
 
 
+# Shared read-only connection for metadata lookups - avoids paying journal
+# setup and a cold page cache on every _get_sheets_info call. The inode of
+# the file it was opened against is tracked because the Drive/Dropbox
+# restore paths swap the database in with os.replace: the open handle would
+# otherwise keep serving the pre-restore file forever.
+_read_conn = None
+_read_conn_ino = None
+
+
+def invalidate_read_connection():
+    """Close the shared read connection so the next call reopens it"""
+    global _read_conn, _read_conn_ino
+    if _read_conn is not None:
+        try:
+            _read_conn.close()
+        except Exception:
+            pass
+    _read_conn = None
+    _read_conn_ino = None
+
+
+def _get_read_connection():
+    """Get (lazily open) the shared read-only connection to the database"""
+    global _read_conn, _read_conn_ino
+    try:
+        ino = os.stat(DATABASE_FILE).st_ino
+    except OSError:
+        ino = None
+    if _read_conn is not None and ino != _read_conn_ino:
+        # The database file was replaced (restore) - drop the stale handle
+        invalidate_read_connection()
+    if _read_conn is None:
+        conn = sqlite3.connect(f'file:{DATABASE_FILE}?mode=ro', uri=True,
+                               check_same_thread=False)
+        cursor = conn.cursor()
+        # Serve pages via mmap instead of pread, and keep a 64 MiB page cache
+        cursor.execute('PRAGMA mmap_size=268435456')
+        cursor.execute('PRAGMA cache_size=-65536')
+        _read_conn = conn
+        _read_conn_ino = ino
+    return _read_conn
+
+
 def _get_sheets_info():
     """Get list of sheets from the database - spreadsheet_id is the primary key"""
-    import sqlite3
     sheets = []
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = _get_read_connection().cursor()
         cursor.execute('SELECT spreadsheet_id, sheet_name, spreadsheet_title FROM sheets')
-        for row in cursor.fetchall():
+        for spreadsheet_id, sheet_name, spreadsheet_title in cursor.fetchall():
             sheets.append({
-                'spreadsheet_id': row['spreadsheet_id'],
-                'name': row['sheet_name'],
-                'title': row['spreadsheet_title']
+                'spreadsheet_id': spreadsheet_id,
+                'name': sheet_name,
+                'title': spreadsheet_title
             })
-        conn.close()
     except Exception as e:
-        print(f"Error getting sheets info: {e}")
+        logger.error("Error getting sheets info: %s", e)
     return sheets
 
 
 def _get_all_spreadsheet_ids():
     """Get all unique spreadsheet IDs from the database"""
-    import sqlite3
-    spreadsheet_ids = set()
+    spreadsheet_ids = []
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
+        cursor = _get_read_connection().cursor()
         cursor.execute('SELECT DISTINCT spreadsheet_id FROM sheets')
-        for row in cursor.fetchall():
-            spreadsheet_ids.add(row[0])
-        conn.close()
+        spreadsheet_ids = [row[0] for row in cursor.fetchall()]
     except:
         pass
-    return list(spreadsheet_ids)
+    return spreadsheet_ids
 
 
 def upload_backup_to_cloud(source='manual', notes='', user_email=''):
@@ -505,51 +658,119 @@ def upload_backup_to_cloud(source='manual', notes='', user_email=''):
         if not spreadsheet_ids:
             return {'success': False, 'error': 'No spreadsheets found in database'}
 
-        # Check if data has changed since last backup (check first spreadsheet's index)
-        index = _load_backup_index_for_spreadsheet(spreadsheet_ids[0])
-        if index.get('backups'):
-            last_backup = max(index['backups'], key=lambda x: x['timestamp'])
+        # Check if data has changed since last backup. Check the global index -
+        # the one new backups are actually written to - so the skip fires even
+        # when the per-spreadsheet indexes are stale.
+        global_index_bin_id = os.environ.get('JSONBIN_INDEX_BIN_ID') or HARDCODED_INDEX_BIN_ID
+        global_index = _load_cloud_index_direct(global_index_bin_id)
+        if global_index.get('backups'):
+            last_backup = max(global_index['backups'], key=itemgetter('timestamp'))
             if last_backup.get('hash') == current_hash:
-                print('Backup skipped: data unchanged since last backup')
+                logger.info('Backup skipped: data unchanged since last backup')
                 return {
                     'success': True,
                     'skipped': True,
+                    'cached': True,
+                    'file': {
+                        'id': last_backup.get('id'),
+                        'name': last_backup.get('name'),
+                        'size': last_backup.get('size', 0)
+                    },
                     'message': 'No changes since last backup'
                 }
 
-        # Read and compress database file
-        with open(DATABASE_FILE, 'rb') as f:
-            db_content = f.read()
-
-        # Compress with zlib for smaller size
-        compressed = zlib.compress(db_content, 9)
+        # zstd when available (faster and better ratio), zlib otherwise.
+        db_size = os.path.getsize(DATABASE_FILE)
+        if zstd is not None:
+            compressor = zstd.ZstdCompressor(level=15, threads=-1).compressobj()
+            codec = 'zstd'
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL)
+            codec = 'zlib'
 
-        # Create backup data
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_name = f'attendance_backup_{timestamp}'
+        # Create backup metadata - the 'data' field is streamed separately below
+        now = datetime.now()
+        backup_name = f"attendance_backup_{now.strftime('%Y%m%d_%H%M%S')}"
 
         backup_data = {
             'name': backup_name,
-            'timestamp': datetime.now().isoformat(),
-            'size': len(db_content),
+            'timestamp': now.isoformat(),
+            'size': db_size,
             'compressed': True,
+            'codec': codec,
             'sheets': sheets_info,
             'spreadsheet_ids': spreadsheet_ids,
-            'data': base64.b64encode(compressed).decode('utf-8')
+            # base85 expands by ~25% vs base64's 33% - matters with JSONBin's
+            # 100KB-per-bin limit
+            'encoding': 'b85'
         }
 
+        # Pipeline compression with the upload: a producer thread reads 256 KB
+        # file chunks and pushes compressed+b85-encoded frames into a bounded
+        # queue, while requests streams the JSON body from a generator draining
+        # it (chunked transfer-encoding). The network transfer overlaps with
+        # compression instead of waiting for it to finish. The b85 alphabet
+        # contains no quote or backslash, so frames can be spliced straight
+        # into the JSON string; b85 needs input in 4-byte groups, so a small
+        # remainder carries over between frames.
+        frames = queue.Queue(maxsize=4)
+
+        def _produce():
+            try:
+                pending = bytearray()
+                with open(DATABASE_FILE, 'rb') as f:
+                    while True:
+                        chunk = f.read(262144)
+                        if not chunk:
+                            break
+                        pending += compressor.compress(chunk)
+                        emit = len(pending) - (len(pending) % 4)
+                        if emit:
+                            frames.put(base64.b85encode(bytes(pending[:emit])))
+                            del pending[:emit]
+                pending += compressor.flush()
+                if pending:
+                    frames.put(base64.b85encode(bytes(pending)))
+                frames.put(None)
+            except Exception as e:
+                frames.put(e)
+
+        def _request_body():
+            # '{...}' -> '{..., "data":"<frames>"}'
+            yield _json_body(backup_data)[:-1] + b',"data":"'
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
+                yield frame
+            yield b'"}'
+
         # Upload to JSONBin
         headers = _get_headers()
         headers['X-Bin-Name'] = backup_name
 
-        response = requests.post(
-            f'{JSONBIN_API_URL}/b',
-            headers=headers,
-            json=backup_data
-        )
+        producer = threading.Thread(target=_produce, daemon=True)
+        producer.start()
+        try:
+            response = _session.post(
+                f'{JSONBIN_API_URL}/b',
+                headers=headers,
+                data=_request_body()
+            )
+        finally:
+            # If the upload aborted mid-stream, drain so the producer isn't
+            # left blocked on a full queue
+            while producer.is_alive():
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    time.sleep(0.01)
+            producer.join()
 
         if response.status_code in [200, 201]:
-            result = response.json()
+            result = _parse_json_response(response)
             bin_id = result.get('metadata', {}).get('id')
 
             # Create backup entry for index
@@ -567,19 +788,20 @@ def upload_backup_to_cloud(source='manual', notes='', user_email=''):
             }
 
             # Save to the global hardcoded index (primary index for listing)
-            global_index_bin_id = os.environ.get('JSONBIN_INDEX_BIN_ID') or HARDCODED_INDEX_BIN_ID
-            global_index = _load_cloud_index_direct(global_index_bin_id)
+            # Reuse the index loaded for the hash check above - no second fetch
             global_index['backups'].append(backup_entry)
             global_index = _cleanup_old_backups(global_index)
 
             # Update global index in cloud
             headers_update = _get_headers()
-            requests.put(
+            _session.put(
                 f'{JSONBIN_API_URL}/b/{global_index_bin_id}',
                 headers=headers_update,
-                json=global_index
+                data=_json_body(global_index)
             )
-            print(f"Backup saved to global index: {bin_id}")
+            # Keep the local index cache in step with what was just written
+            _index_cache[global_index_bin_id] = (time.time(), global_index)
+            logger.info("Backup saved to global index: %s", bin_id)
 
             return {
                 'success': True,
@@ -616,7 +838,7 @@ def list_cloud_backups(filter_sheet_id=None, spreadsheet_id=None):
         # This ensures backups created on one machine are visible on all machines
         direct_index_bin_id = os.environ.get('JSONBIN_INDEX_BIN_ID') or HARDCODED_INDEX_BIN_ID
         if direct_index_bin_id:
-            print(f"Using index bin ID: {direct_index_bin_id[:8]}...")
+            logger.info("Using index bin ID: %s...", direct_index_bin_id[:8])
             index = _load_cloud_index_direct(direct_index_bin_id)
         else:
             # Fallback to spreadsheet-specific or local index
@@ -625,27 +847,37 @@ def list_cloud_backups(filter_sheet_id=None, spreadsheet_id=None):
             else:
                 index = _load_backup_index()
 
-        backups = []
-
-        for backup in index.get('backups', []):
-            # Filter by spreadsheet_id if provided (preferred - matches Google Spreadsheet)
-            # This is better than filter_sheet_id because internal DB IDs can change
-            if spreadsheet_id is not None:
-                backup_sheets = backup.get('sheets', [])
-                if backup_sheets:  # Only filter if we have sheet info
-                    backup_spreadsheet_ids = [s.get('spreadsheet_id') for s in backup_sheets]
-                    if spreadsheet_id not in backup_spreadsheet_ids:
-                        continue  # Skip backups from different Google Spreadsheets
-            # Fallback: filter by sheet_id if provided and no spreadsheet_id filter
-            elif filter_sheet_id is not None:
-                backup_sheets = backup.get('sheets', [])
-                # If sheets list is empty, show the backup (it's a full backup)
-                # Otherwise check if this backup contains the requested sheet
-                if backup_sheets:  # Only filter if we have sheet info
-                    sheet_ids = [s.get('id') for s in backup_sheets]
-                    if filter_sheet_id not in sheet_ids:
-                        continue  # Skip backups that don't include this sheet
+        all_backups = index.get('backups', [])
+
+        # Filter by spreadsheet_id if provided (preferred - matches Google
+        # Spreadsheet; internal DB IDs can change), else by sheet_id. Backups
+        # without sheet info are full backups and always shown. New indexes
+        # carry secondary maps (bin ids per sheet/spreadsheet), so filtering
+        # is a set-membership check instead of scanning each backup's
+        # embedded sheet list; older indexes fall back to the scan.
+        if spreadsheet_id is not None:
+            if 'by_spreadsheet' in index:
+                wanted = set(index['by_spreadsheet'].get(spreadsheet_id, []))
+                selected = [b for b in all_backups
+                            if not b.get('sheets') or b['id'] in wanted]
+            else:
+                selected = [b for b in all_backups
+                            if not b.get('sheets')
+                            or spreadsheet_id in {s.get('spreadsheet_id') for s in b['sheets']}]
+        elif filter_sheet_id is not None:
+            if 'by_sheet' in index:
+                wanted = set(index['by_sheet'].get(str(filter_sheet_id), []))
+                selected = [b for b in all_backups
+                            if not b.get('sheets') or b['id'] in wanted]
+            else:
+                selected = [b for b in all_backups
+                            if not b.get('sheets')
+                            or filter_sheet_id in {s.get('id') for s in b['sheets']}]
+        else:
+            selected = all_backups
 
+        backups = []
+        for backup in selected:
             backups.append({
                 'id': backup['id'],
                 'filename': backup['name'],
@@ -658,8 +890,11 @@ def list_cloud_backups(filter_sheet_id=None, spreadsheet_id=None):
                 'user_email': backup.get('user_email', '')  # User who created the backup
             })
 
-        # Sort by timestamp descending
-        backups.sort(key=lambda x: x['timestamp'], reverse=True)
+        # The index is kept sorted newest-first at write time
+        # (_cleanup_old_backups), so only re-sort if it arrived out of order
+        timestamps = [b['timestamp'] for b in backups]
+        if any(timestamps[i] < timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            backups.sort(key=itemgetter('timestamp'), reverse=True)
         return {'success': True, 'backups': backups}
 
     except Exception as e:
@@ -675,23 +910,41 @@ def download_backup_from_cloud(bin_id):
     try:
         headers = _get_headers()
 
-        response = requests.get(
+        response = _session.get(
             f'{JSONBIN_API_URL}/b/{bin_id}/latest',
             headers=headers
         )
 
         if response.status_code == 200:
-            result = response.json()
+            result = _parse_json_response(response)
             record = result.get('record', {})
 
-            # Decode base64 data
-            encoded_data = base64.b64decode(record.get('data', ''))
+            # Decode payload - new backups use base85, older ones base64
+            data_str = record.get('data', '')
+            is_b85 = record.get('encoding', 'b64') == 'b85'
+            decode = base64.b85decode if is_b85 else base64.b64decode
 
-            # Decompress if compressed
             if record.get('compressed', False):
-                db_content = zlib.decompress(encoded_data)
+                # Pick decompressor - new backups are zstd, older ones zlib
+                codec = record.get('codec', 'zlib')
+                if codec == 'zstd':
+                    if zstd is None:
+                        return {'success': False,
+                                'error': 'Backup is zstd-compressed but zstandard is not installed'}
+                    decomp = zstd.ZstdDecompressor().decompressobj()
+                else:
+                    decomp = zlib.decompressobj()
+                # Decode and decompress in chunks so the encoded text, the
+                # compressed bytes and the decompressed DB never all exist in
+                # full at the same time - roughly halves peak memory
+                chunk_chars = 65540 if is_b85 else 65536  # multiple of 5 / 4
+                out = bytearray()
+                for i in range(0, len(data_str), chunk_chars):
+                    out += decomp.decompress(decode(data_str[i:i + chunk_chars]))
+                out += decomp.flush()
+                db_content = bytes(out)
             else:
-                db_content = encoded_data
+                db_content = decode(data_str)
 
             return {
                 'success': True,
@@ -742,7 +995,6 @@ def compare_with_cloud(bin_id, spreadsheet_id=None):
     Uses spreadsheet_id as the primary key (Google Sheet ID).
     """
     import tempfile
-    import sqlite3
 
     # Download the backup
     result = download_backup_from_cloud(bin_id)
@@ -750,16 +1002,31 @@ def compare_with_cloud(bin_id, spreadsheet_id=None):
         return result
 
     try:
-        # Write backup to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as tmp:
-            tmp.write(result['content'])
-            tmp_path = tmp.name
-
-        # Connect to both databases
-        current_conn = sqlite3.connect(DATABASE_FILE)
-        current_conn.row_factory = sqlite3.Row
-        backup_conn = sqlite3.connect(tmp_path)
-        backup_conn.row_factory = sqlite3.Row
+        # Open the downloaded backup directly in memory (Connection.deserialize,
+        # Python 3.11+) - avoids the write-to-disk/read-back round-trip. Fall
+        # back to a temp file if deserialize is unavailable or rejects the blob.
+        tmp_path = None
+        backup_conn = sqlite3.connect(':memory:', check_same_thread=False)
+        try:
+            backup_conn.deserialize(result['content'])
+        except (AttributeError, sqlite3.Error):
+            backup_conn.close()
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as tmp:
+                tmp.write(result['content'])
+                tmp_path = tmp.name
+            backup_conn = sqlite3.connect(tmp_path, check_same_thread=False)
+
+        # Attach the live database to the backup connection and let SQLite
+        # compute the attendance diff itself - only the differing rows ever
+        # reach Python, so memory stays O(diff) instead of O(total rows).
+        backup_conn.execute('ATTACH DATABASE ? AS cur', (DATABASE_FILE,))
+
+        # Backup DBs from old versions may lack tables; empty stand-ins make
+        # the diff queries below degrade to "everything added"
+        backup_conn.execute('''CREATE TABLE IF NOT EXISTS main.attendance
+            (spreadsheet_id TEXT, ma TEXT, date TEXT, status TEXT)''')
+        backup_conn.execute('''CREATE TABLE IF NOT EXISTS main.team_members
+            (spreadsheet_id TEXT, ma TEXT, first_name TEXT, last_name TEXT)''')
 
         differences = {
             'attendance_changes': [],
@@ -773,160 +1040,204 @@ def compare_with_cloud(bin_id, spreadsheet_id=None):
             spreadsheet_ids = [spreadsheet_id]
         else:
             # Get all spreadsheet IDs from current DB
-            cursor = current_conn.cursor()
-            cursor.execute('SELECT spreadsheet_id FROM sheets')
-            spreadsheet_ids = [row['spreadsheet_id'] for row in cursor.fetchall()]
-
-        for ssid in spreadsheet_ids:
-            # Compare attendance data
-            current_cursor = current_conn.cursor()
-            backup_cursor = backup_conn.cursor()
-
-            # Get current attendance
-            current_cursor.execute('''
-                SELECT a.ma, a.date, a.status, t.first_name, t.last_name
-                FROM attendance a
-                LEFT JOIN team_members t ON a.spreadsheet_id = t.spreadsheet_id AND a.ma = t.ma
-                WHERE a.spreadsheet_id = ?
-            ''', (ssid,))
-            current_attendance = {(row['ma'], row['date']): {
-                'status': row['status'],
-                'name': f"{row['first_name'] or ''} {row['last_name'] or ''}".strip()
-            } for row in current_cursor.fetchall()}
-
-            # Get backup attendance
-            try:
-                backup_cursor.execute('''
-                    SELECT a.ma, a.date, a.status, t.first_name, t.last_name
-                    FROM attendance a
-                    LEFT JOIN team_members t ON a.spreadsheet_id = t.spreadsheet_id AND a.ma = t.ma
-                    WHERE a.spreadsheet_id = ?
-                ''', (ssid,))
-                backup_attendance = {(row['ma'], row['date']): {
-                    'status': row['status'],
-                    'name': f"{row['first_name'] or ''} {row['last_name'] or ''}".strip()
-                } for row in backup_cursor.fetchall()}
-            except:
-                backup_attendance = {}
-
-            # Find differences
-            all_keys = set(current_attendance.keys()) | set(backup_attendance.keys())
-
-            for key in all_keys:
-                ma, date = key
-                current_data = current_attendance.get(key)
-                backup_data = backup_attendance.get(key)
-
-                if current_data and backup_data:
-                    if current_data['status'] != backup_data['status']:
-                        differences['attendance_changes'].append({
-                            'ma': ma,
-                            'date': date,
-                            'name': current_data['name'] or backup_data['name'],
-                            'current_status': current_data['status'],
-                            'backup_status': backup_data['status']
-                        })
-                elif current_data and not backup_data:
-                    differences['attendance_changes'].append({
-                        'ma': ma,
-                        'date': date,
-                        'name': current_data['name'],
-                        'current_status': current_data['status'],
-                        'backup_status': None,
-                        'type': 'added'
-                    })
-                elif backup_data and not current_data:
-                    differences['attendance_changes'].append({
-                        'ma': ma,
-                        'date': date,
-                        'name': backup_data['name'],
-                        'current_status': None,
-                        'backup_status': backup_data['status'],
-                        'type': 'removed'
-                    })
-
-            # Compare team members
-            current_cursor.execute('SELECT ma, first_name, last_name FROM team_members WHERE spreadsheet_id = ?', (ssid,))
-            current_members = {row['ma']: f"{row['first_name']} {row['last_name']}" for row in current_cursor.fetchall()}
-
-            try:
-                backup_cursor.execute('SELECT ma, first_name, last_name FROM team_members WHERE spreadsheet_id = ?', (ssid,))
-                backup_members = {row['ma']: f"{row['first_name']} {row['last_name']}" for row in backup_cursor.fetchall()}
-            except:
-                backup_members = {}
-
-            # Members in current but not backup
-            for ma in set(current_members.keys()) - set(backup_members.keys()):
-                differences['members_added'].append({'ma': ma, 'name': current_members[ma]})
-
-            # Members in backup but not current
-            for ma in set(backup_members.keys()) - set(current_members.keys()):
-                differences['members_removed'].append({'ma': ma, 'name': backup_members[ma]})
+            cursor = backup_conn.execute('SELECT spreadsheet_id FROM cur.sheets')
+            spreadsheet_ids = [row[0] for row in cursor.fetchall()]
+
+        placeholders = ','.join('?' * len(spreadsheet_ids))
+
+        # Member name maps stay in Python - they are small, are needed for the
+        # name lookups on emitted diff rows, and drive the membership diff
+        def _bucket_members(table):
+            buckets = {ssid: {} for ssid in spreadsheet_ids}
+            cursor = backup_conn.execute(f'''
+                SELECT spreadsheet_id, ma, first_name, last_name
+                FROM {table}
+                WHERE spreadsheet_id IN ({placeholders})
+            ''', spreadsheet_ids)
+            for row_ssid, ma, first_name, last_name in cursor:
+                # join+filter skips the or-''/strip dance and allocates once
+                buckets[row_ssid][ma] = ' '.join(filter(None, (first_name, last_name)))
+            return buckets
+
+        # Counters incremented as changes are appended - the summary block
+        # then reads them instead of re-scanning the change list three times
+        attendance_changed = attendance_added = attendance_removed = 0
+
+        if spreadsheet_ids:
+            current_member_buckets = _bucket_members('cur.team_members')
+            backup_member_buckets = _bucket_members('main.team_members')
+
+            # Rows present on both sides with a different status
+            changed_cursor = backup_conn.execute(f'''
+                SELECT c.spreadsheet_id, c.ma, c.date, c.status, b.status
+                FROM cur.attendance c
+                JOIN main.attendance b
+                  ON b.spreadsheet_id = c.spreadsheet_id AND b.ma = c.ma AND b.date = c.date
+                WHERE c.spreadsheet_id IN ({placeholders}) AND c.status != b.status
+            ''', spreadsheet_ids)
+            for row_ssid, ma, date, cur_status, bak_status in changed_cursor:
+                differences['attendance_changes'].append({
+                    'ma': ma,
+                    'date': date,
+                    'name': current_member_buckets[row_ssid].get(ma)
+                            or backup_member_buckets[row_ssid].get(ma) or '',
+                    'current_status': cur_status,
+                    'backup_status': bak_status
+                })
+                attendance_changed += 1
+
+            # Rows only in the current database
+            added_cursor = backup_conn.execute(f'''
+                SELECT c.spreadsheet_id, c.ma, c.date, c.status
+                FROM cur.attendance c
+                LEFT JOIN main.attendance b
+                  ON b.spreadsheet_id = c.spreadsheet_id AND b.ma = c.ma AND b.date = c.date
+                WHERE c.spreadsheet_id IN ({placeholders}) AND b.ma IS NULL
+            ''', spreadsheet_ids)
+            for row_ssid, ma, date, status in added_cursor:
+                differences['attendance_changes'].append({
+                    'ma': ma,
+                    'date': date,
+                    'name': current_member_buckets[row_ssid].get(ma, ''),
+                    'current_status': status,
+                    'backup_status': None,
+                    'type': 'added'
+                })
+                attendance_added += 1
+
+            # Rows only in the backup
+            removed_cursor = backup_conn.execute(f'''
+                SELECT b.spreadsheet_id, b.ma, b.date, b.status
+                FROM main.attendance b
+                LEFT JOIN cur.attendance c
+                  ON c.spreadsheet_id = b.spreadsheet_id AND c.ma = b.ma AND c.date = b.date
+                WHERE b.spreadsheet_id IN ({placeholders}) AND c.ma IS NULL
+            ''', spreadsheet_ids)
+            for row_ssid, ma, date, status in removed_cursor:
+                differences['attendance_changes'].append({
+                    'ma': ma,
+                    'date': date,
+                    'name': backup_member_buckets[row_ssid].get(ma, ''),
+                    'current_status': None,
+                    'backup_status': status,
+                    'type': 'removed'
+                })
+                attendance_removed += 1
+
+            for ssid in spreadsheet_ids:
+                current_members = current_member_buckets[ssid]
+                backup_members = backup_member_buckets[ssid]
+
+                # Members in current but not backup
+                for ma in current_members.keys() - backup_members.keys():
+                    differences['members_added'].append({'ma': ma, 'name': current_members[ma]})
+
+                # Members in backup but not current
+                for ma in backup_members.keys() - current_members.keys():
+                    differences['members_removed'].append({'ma': ma, 'name': backup_members[ma]})
 
         # Summary
         differences['summary'] = {
-            'attendance_changed': len([d for d in differences['attendance_changes'] if 'type' not in d]),
-            'attendance_added': len([d for d in differences['attendance_changes'] if d.get('type') == 'added']),
-            'attendance_removed': len([d for d in differences['attendance_changes'] if d.get('type') == 'removed']),
+            'attendance_changed': attendance_changed,
+            'attendance_added': attendance_added,
+            'attendance_removed': attendance_removed,
             'members_added': len(differences['members_added']),
             'members_removed': len(differences['members_removed'])
         }
 
-        current_conn.close()
         backup_conn.close()
 
-        # Clean up temp file
-        os.remove(tmp_path)
+        # Clean up temp file (only used on the deserialize fallback path)
+        if tmp_path:
+            os.remove(tmp_path)
 
         return {
             'success': True,
             'differences': differences,
-            'has_changes': any([
-                differences['summary']['attendance_changed'],
-                differences['summary']['attendance_added'],
-                differences['summary']['attendance_removed'],
-                differences['summary']['members_added'],
-                differences['summary']['members_removed']
-            ])
+            # Any non-empty diff list means there are changes - O(1), no need
+            # to consult the summary counts
+            'has_changes': bool(
+                differences['attendance_changes']
+                or differences['members_added']
+                or differences['members_removed']
+            )
         }
 
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
-def delete_cloud_backup(bin_id):
-    """Delete a backup from JSONBin and all spreadsheet indexes"""
+def delete_cloud_backups(bin_ids):
+    """Delete multiple backups from JSONBin, rewriting each index only once.
+
+    The bin DELETEs run concurrently over the shared session; the global and
+    per-spreadsheet indexes are then each updated in a single pass instead of
+    once per backup.
+    """
     api_key = get_api_key()
     if not api_key:
         return {'success': False, 'error': 'Cloud backup not configured'}
 
     try:
         headers = _get_headers()
+        remove = set(bin_ids)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [
+                executor.submit(_session.delete,
+                                f'{JSONBIN_API_URL}/b/{bin_id}',
+                                headers=headers)
+                for bin_id in remove
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    # Keep going - the index updates below still drop the entry
+                    logger.error("Failed to delete backup bin: %s", e)
+        _index_cache.clear()
+
+        # Rewrite the global index once with every deleted id filtered out
+        global_index_bin_id = os.environ.get('JSONBIN_INDEX_BIN_ID') or HARDCODED_INDEX_BIN_ID
+        global_index = _load_cloud_index_direct(global_index_bin_id)
+        kept = [b for b in global_index.get('backups', []) if b['id'] not in remove]
+        if len(kept) < len(global_index.get('backups', [])):
+            global_index['backups'] = kept
+            for mapping in ('by_sheet', 'by_spreadsheet'):
+                if mapping in global_index:
+                    global_index[mapping] = {
+                        key: [i for i in ids if i not in remove]
+                        for key, ids in global_index[mapping].items()
+                    }
+            _session.put(
+                f'{JSONBIN_API_URL}/b/{global_index_bin_id}',
+                headers=headers,
+                data=_json_body(global_index)
+            )
+            _index_cache[global_index_bin_id] = (time.time(), global_index)
 
-        response = requests.delete(
-            f'{JSONBIN_API_URL}/b/{bin_id}',
-            headers=headers
-        )
-
-        # Remove from all spreadsheet indexes
+        # Remove from all spreadsheet indexes (one rewrite per index)
         spreadsheet_ids = _get_all_spreadsheet_ids()
         for spreadsheet_id in spreadsheet_ids:
             ss_index = _load_backup_index_for_spreadsheet(spreadsheet_id)
             original_count = len(ss_index.get('backups', []))
-            ss_index['backups'] = [b for b in ss_index.get('backups', []) if b['id'] != bin_id]
+            ss_index['backups'] = [b for b in ss_index.get('backups', []) if b['id'] not in remove]
             if len(ss_index['backups']) < original_count:
                 _save_backup_index_for_spreadsheet(spreadsheet_id, ss_index)
 
-        if response.status_code == 200:
-            return {'success': True}
-        else:
-            # Still return success since we removed from indexes
-            return {'success': True}
+        # Deletion failures are tolerated - the entries are gone from the
+        # indexes either way
+        return {'success': True}
 
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
 
+def delete_cloud_backup(bin_id):
+    """Delete a backup from JSONBin and all indexes"""
+    return delete_cloud_backups([bin_id])
+
+
 def clear_all_cloud_backups():
     """Clear all backup references from the cloud index (reset to empty)"""
     api_key = get_api_key()
@@ -941,11 +1252,12 @@ def clear_all_cloud_backups():
         empty_index = {'backups': [], 'cleared_at': datetime.now().isoformat()}
 
         headers = _get_headers()
-        response = requests.put(
+        response = _session.put(
             f'{JSONBIN_API_URL}/b/{index_bin_id}',
             headers=headers,
-            json=empty_index
+            data=_json_body(empty_index)
         )
+        _index_cache.clear()
 
         # Also clear local cache files
         for cache_file in [INDEX_FILE, INDEX_BIN_CACHE_FILE, LEGACY_INDEX_BIN_ID_FILE]:
@@ -1,6 +1,10 @@
 import os
+import time
+import threading
+import logging
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from datetime import datetime
 
 # Database connection URL from environment variable (Neon PostgreSQL)
@@ -11,9 +15,34 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKUP_DIR = os.path.join(SCRIPT_DIR, 'data', 'backups')
 MAX_BACKUPS = 10
 
-# Simple connection function - no pooling for now (Neon has its own pooler)
+# Sync debug logging is off unless explicitly enabled - the f-string
+# formatting and stdout lock were being paid on every attendance write
+logger = logging.getLogger(__name__)
+if logger.level == logging.NOTSET:
+    logger.setLevel(logging.WARNING)
+
+def _configure_connection(conn):
+    """Applied to every pooled connection when it's created"""
+    # Prepare each parameterized query on first execution - the server skips
+    # parse/plan on repeats, and since connections persist in the pool the
+    # prepared-statement cache survives across requests
+    conn.prepare_threshold = 0
+
+# Shared connection pool - opening a fresh TCP+TLS+auth handshake per call
+# cost ~50ms+ and dominated every request. Connections are reused and
+# returned to the pool by the `with POOL.connection()` context managers.
+POOL = ConnectionPool(
+    DATABASE_URL,
+    min_size=10,
+    max_size=50,
+    max_idle=300,
+    configure=_configure_connection,
+    open=True
+)
+
 def get_db_connection():
-    """Get a database connection"""
+    """Legacy: open a dedicated connection (caller must close it).
+    Internal code paths use the shared POOL instead."""
     return psycopg.connect(DATABASE_URL)
 
 def get_dict_cursor(conn):
@@ -51,134 +80,150 @@ def _post_restore_sync_setup():
     increment_data_version()
     print("Post-restore: Incremented data version to force full reload on all clients")
 
+# Every client poll checks the data version, but it only changes on writes.
+# Serve it from a short-TTL process cache; increment_data_version refreshes
+# the cached value directly so local writers see their bump immediately.
+DATA_VERSION_CACHE_SECONDS = 1.0
+_cached_version = None
+_cached_version_ts = 0.0
+_version_lock = threading.Lock()
+
 def get_data_version():
-    """Get the current data version number from database"""
-    try:
-        conn = get_db_connection()
-        cursor = get_dict_cursor(conn)
+    """Get the current data version number (cached for a short interval)"""
+    global _cached_version, _cached_version_ts
+    with _version_lock:
+        if _cached_version is not None and time.time() - _cached_version_ts < DATA_VERSION_CACHE_SECONDS:
+            return _cached_version
+    # init_database() runs at import, so the table and row are guaranteed -
+    # no first-run try/except on this hot path. Default (tuple) cursor: no
+    # point building a dict for a one-column read.
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT version FROM data_version WHERE id = 1")
         row = cursor.fetchone()
-        conn.close()
-        if row:
-            return row['version']
-    except Exception as e:
-        print(f"get_data_version error (may be first run): {e}")
-    return 1
+    version = row[0] if row else 1
+    with _version_lock:
+        _cached_version = version
+        _cached_version_ts = time.time()
+    return version
 
 def increment_data_version():
     """Increment data version to force all clients to full reload"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO data_version (id, version) VALUES (1, 2)
-            ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1
-            RETURNING version
-        """)
-        result = cursor.fetchone()
-        new_version = result[0] if result else 2
-        conn.commit()
-        print(f"Data version incremented to: {new_version}")
-        return new_version
+        with POOL.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO data_version (id, version) VALUES (1, 2)
+                ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1
+                RETURNING version
+            """)
+            result = cursor.fetchone()
+            new_version = result[0] if result else 2
+            global _cached_version, _cached_version_ts
+            with _version_lock:
+                _cached_version = new_version
+                _cached_version_ts = time.time()
+            print(f"Data version incremented to: {new_version}")
+            return new_version
     except Exception as e:
         print(f"increment_data_version error: {e}")
-        conn.rollback()
         return 1
-    finally:
-        conn.close()
 
 def init_database():
     """Initialize the database schema - using spreadsheet_id (Google Sheet ID) as primary key"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Data version table for sync
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS data_version (
-            id INTEGER PRIMARY KEY,
-            version INTEGER DEFAULT 1
-        )
-    ''')
-
-    # Initialize data version if not exists
-    cursor.execute('''
-        INSERT INTO data_version (id, version) VALUES (1, 1)
-        ON CONFLICT (id) DO NOTHING
-    ''')
-
-    # Sheets table - spreadsheet_id (Google Sheet ID) is the PRIMARY KEY
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sheets (
-            spreadsheet_id TEXT PRIMARY KEY,
-            spreadsheet_title TEXT DEFAULT '',
-            sheet_name TEXT DEFAULT '',
-            gdud TEXT DEFAULT '',
-            pluga TEXT DEFAULT '',
-            start_date TEXT DEFAULT '2025-12-21',
-            end_date TEXT DEFAULT '2026-02-01',
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Team members table - linked directly to spreadsheet_id
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS team_members (
-            id SERIAL PRIMARY KEY,
-            spreadsheet_id TEXT NOT NULL,
-            first_name TEXT DEFAULT '',
-            last_name TEXT DEFAULT '',
-            ma TEXT DEFAULT '',
-            gdud TEXT DEFAULT '',
-            pluga TEXT DEFAULT '',
-            mahlaka TEXT DEFAULT '',
-            miktzoa_tzvai TEXT DEFAULT '',
-            notes TEXT DEFAULT '',
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (spreadsheet_id) REFERENCES sheets(spreadsheet_id) ON DELETE CASCADE
-        )
-    ''')
-
-    # Add notes column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE team_members ADD COLUMN notes TEXT DEFAULT ""')
-    except:
-        pass  # Column already exists
-
-    # Attendance table - linked directly to spreadsheet_id
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id SERIAL PRIMARY KEY,
-            spreadsheet_id TEXT NOT NULL,
-            ma TEXT NOT NULL,
-            date TEXT NOT NULL,
-            status TEXT DEFAULT 'unmarked',
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_by_session TEXT DEFAULT '',
-            FOREIGN KEY (spreadsheet_id) REFERENCES sheets(spreadsheet_id) ON DELETE CASCADE,
-            UNIQUE(spreadsheet_id, ma, date)
-        )
-    ''')
-
-    # Active users table - linked directly to spreadsheet_id
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS active_users (
-            session_id TEXT PRIMARY KEY,
-            email TEXT DEFAULT 'Anonymous',
-            spreadsheet_id TEXT NOT NULL,
-            last_seen REAL NOT NULL,
-            FOREIGN KEY (spreadsheet_id) REFERENCES sheets(spreadsheet_id) ON DELETE CASCADE
-        )
-    ''')
-
-    # Create indexes for faster lookups
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_spreadsheet ON attendance(spreadsheet_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_ma ON attendance(ma)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_team_members_spreadsheet ON team_members(spreadsheet_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_active_users_spreadsheet ON active_users(spreadsheet_id)')
-
-    conn.commit()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+
+        # Data version table for sync
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY,
+                version INTEGER DEFAULT 1
+            )
+        ''')
+
+        # Initialize data version if not exists
+        cursor.execute('''
+            INSERT INTO data_version (id, version) VALUES (1, 1)
+            ON CONFLICT (id) DO NOTHING
+        ''')
+
+        # Sheets table - spreadsheet_id (Google Sheet ID) is the PRIMARY KEY
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sheets (
+                spreadsheet_id TEXT PRIMARY KEY,
+                spreadsheet_title TEXT DEFAULT '',
+                sheet_name TEXT DEFAULT '',
+                gdud TEXT DEFAULT '',
+                pluga TEXT DEFAULT '',
+                start_date TEXT DEFAULT '2025-12-21',
+                end_date TEXT DEFAULT '2026-02-01',
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Team members table - linked directly to spreadsheet_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS team_members (
+                id SERIAL PRIMARY KEY,
+                spreadsheet_id TEXT NOT NULL,
+                first_name TEXT DEFAULT '',
+                last_name TEXT DEFAULT '',
+                ma TEXT DEFAULT '',
+                gdud TEXT DEFAULT '',
+                pluga TEXT DEFAULT '',
+                mahlaka TEXT DEFAULT '',
+                miktzoa_tzvai TEXT DEFAULT '',
+                notes TEXT DEFAULT '',
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (spreadsheet_id) REFERENCES sheets(spreadsheet_id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Add notes column if it doesn't exist (for existing databases)
+        try:
+            cursor.execute('ALTER TABLE team_members ADD COLUMN notes TEXT DEFAULT ""')
+        except:
+            pass  # Column already exists
+
+        # Attendance table - linked directly to spreadsheet_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS attendance (
+                id SERIAL PRIMARY KEY,
+                spreadsheet_id TEXT NOT NULL,
+                ma TEXT NOT NULL,
+                date TEXT NOT NULL,
+                status TEXT DEFAULT 'unmarked',
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_by_session TEXT DEFAULT '',
+                FOREIGN KEY (spreadsheet_id) REFERENCES sheets(spreadsheet_id) ON DELETE CASCADE,
+                UNIQUE(spreadsheet_id, ma, date)
+            )
+        ''')
+
+        # Active users table - linked directly to spreadsheet_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS active_users (
+                session_id TEXT PRIMARY KEY,
+                email TEXT DEFAULT 'Anonymous',
+                spreadsheet_id TEXT NOT NULL,
+                last_seen REAL NOT NULL,
+                FOREIGN KEY (spreadsheet_id) REFERENCES sheets(spreadsheet_id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Create indexes for faster lookups
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_spreadsheet ON attendance(spreadsheet_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_ma ON attendance(ma)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_team_members_spreadsheet ON team_members(spreadsheet_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_active_users_spreadsheet ON active_users(spreadsheet_id)')
+        # Delta polls filter on (spreadsheet_id, updated_at); without this the
+        # planner scans every row of the sheet and filters by timestamp
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_changes ON attendance(spreadsheet_id, updated_at DESC)')
+        # Makes the stale-session cleanup DELETE an index range scan
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_active_users_last_seen ON active_users(last_seen)')
+
     print("PostgreSQL database initialized successfully")
 
 def migrate_old_data():
@@ -187,91 +232,81 @@ def migrate_old_data():
 
 def get_or_create_sheet(spreadsheet_id, sheet_name='', gdud='', pluga='', spreadsheet_title=''):
     """Get existing sheet or create a new one using spreadsheet_id as the key."""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-
-    # Check if sheet exists
-    cursor.execute('SELECT spreadsheet_id FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    row = cursor.fetchone()
-
-    if row:
-        # Update title if provided
-        if spreadsheet_title:
-            cursor.execute('''
-                UPDATE sheets SET spreadsheet_title = %s, updated_at = %s WHERE spreadsheet_id = %s
-            ''', (spreadsheet_title, datetime.now().isoformat(), spreadsheet_id))
-            conn.commit()
-    else:
-        # Create new sheet entry
+    # Single upsert round-trip instead of SELECT + conditional INSERT/UPDATE.
+    # An existing row only takes the new title (and a fresh updated_at) when
+    # a non-empty title was provided, matching the old two-statement logic.
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga)
             VALUES (%s, %s, %s, %s, %s)
-        ''', (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga))
-        conn.commit()
+            ON CONFLICT (spreadsheet_id) DO UPDATE SET
+                spreadsheet_title = CASE WHEN EXCLUDED.spreadsheet_title <> ''
+                                         THEN EXCLUDED.spreadsheet_title
+                                         ELSE sheets.spreadsheet_title END,
+                updated_at = CASE WHEN EXCLUDED.spreadsheet_title <> ''
+                                  THEN %s
+                                  ELSE sheets.updated_at END
+        ''', (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga,
+              datetime.now().isoformat()))
 
-    conn.close()
     return spreadsheet_id
 
 def get_sheet_by_id(spreadsheet_id):
     """Get sheet info by spreadsheet_id (Google Sheet ID)"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    cursor.execute('SELECT * FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = get_dict_cursor(conn)
+        cursor.execute('SELECT * FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
+        row = cursor.fetchone()
     if row:
         return dict(row)
     return None
 
 def update_sheet_dates(spreadsheet_id, start_date, end_date):
     """Update date range for a sheet"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE sheets SET start_date = %s, end_date = %s, updated_at = %s
-        WHERE spreadsheet_id = %s
-    ''', (start_date, end_date, datetime.now().isoformat(), spreadsheet_id))
-    conn.commit()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE sheets SET start_date = %s, end_date = %s, updated_at = %s
+            WHERE spreadsheet_id = %s
+        ''', (start_date, end_date, datetime.now().isoformat(), spreadsheet_id))
 
 def save_team_members(spreadsheet_id, members):
     """Save team members for a sheet (replaces existing)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Delete existing members for this sheet
-    cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = %s', (spreadsheet_id,))
-
-    # Insert new members
-    for member in members:
-        cursor.execute('''
-            INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            spreadsheet_id,
-            member.get('firstName', ''),
-            member.get('lastName', ''),
-            member.get('ma', ''),
-            member.get('gdud', ''),
-            member.get('pluga', ''),
-            member.get('mahlaka', ''),
-            member.get('miktzoaTzvai', ''),
-            member.get('notes', '')
-        ))
-
-    conn.commit()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+
+        # Delete existing members for this sheet
+        cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = %s', (spreadsheet_id,))
+
+        # COPY streams every member in one round-trip - the per-row INSERT
+        # loop paid one RTT per member on the Neon link
+        with cursor.copy('''
+            COPY team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes)
+            FROM STDIN
+        ''') as copy:
+            for member in members:
+                copy.write_row((
+                    spreadsheet_id,
+                    member.get('firstName', ''),
+                    member.get('lastName', ''),
+                    member.get('ma', ''),
+                    member.get('gdud', ''),
+                    member.get('pluga', ''),
+                    member.get('mahlaka', ''),
+                    member.get('miktzoaTzvai', ''),
+                    member.get('notes', '')
+                ))
 
 def get_team_members(spreadsheet_id):
     """Get all team members for a sheet"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    cursor.execute('''
-        SELECT first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes
-        FROM team_members WHERE spreadsheet_id = %s
-    ''', (spreadsheet_id,))
-    rows = cursor.fetchall()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = get_dict_cursor(conn)
+        cursor.execute('''
+            SELECT first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes
+            FROM team_members WHERE spreadsheet_id = %s
+        ''', (spreadsheet_id,))
+        rows = cursor.fetchall()
 
     members = []
     for row in rows:
@@ -287,95 +322,128 @@ def get_team_members(spreadsheet_id):
         })
     return members
 
+# updated_at is stored as ISO-8601 text and compared lexicographically by the
+# sync queries, so server-side timestamps must keep the same shape as
+# datetime.isoformat()
+_SERVER_ISO_NOW = "to_char(now(), 'YYYY-MM-DD\"T\"HH24:MI:SS.US')"
+
 def update_attendance(spreadsheet_id, ma, date, status, session_id=''):
     """Update attendance for a specific member and date"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    timestamp = datetime.now().isoformat()
-
-    # PostgreSQL upsert syntax
-    cursor.execute('''
-        INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (spreadsheet_id, ma, date)
-        DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at, updated_by_session = EXCLUDED.updated_by_session
-    ''', (spreadsheet_id, ma, date, status, timestamp, session_id))
-
-    print(f"[SYNC DEBUG] Saved attendance: ma={ma}, date={date}, status={status}, session={session_id[:8] if session_id else 'none'}..., time={timestamp}")
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+
+        # The timestamp is generated server-side: one clock for all workers
+        # (no cross-worker skew) and no per-call Python datetime formatting
+        cursor.execute(f'''
+            INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
+            VALUES (%s, %s, %s, %s, {_SERVER_ISO_NOW}, %s)
+            ON CONFLICT (spreadsheet_id, ma, date)
+            DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at, updated_by_session = EXCLUDED.updated_by_session
+            RETURNING updated_at
+        ''', (spreadsheet_id, ma, date, status, session_id))
+        row = cursor.fetchone()
 
-    conn.commit()
-    conn.close()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[SYNC DEBUG] Saved attendance: ma=%s, date=%s, status=%s, session=%s..., time=%s",
+                     ma, date, status, session_id[:8] if session_id else 'none',
+                     row[0] if row else '?')
 
 def update_attendance_batch(spreadsheet_id, updates, session_id=''):
     """Update multiple attendance records in a single transaction"""
     if not updates:
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    timestamp = datetime.now().isoformat()
-
-    # Use executemany for batch insert/update
-    from psycopg.sql import SQL
-
-    # Prepare data for batch insert
-    values = [(spreadsheet_id, u['ma'], u['date'], u['status'], timestamp, session_id) for u in updates]
+    # Unnest the changes into a single upsert statement - the whole batch
+    # goes to the server in one round-trip, vs one per row with executemany.
+    # ON CONFLICT can't touch the same row twice in one statement, so dedupe
+    # repeated (ma, date) cells first; the last status in the batch wins,
+    # matching the sequential executemany behavior.
+    deduped = {(u['ma'], u['date']): u['status'] for u in updates}
+    mas = [ma for ma, _ in deduped]
+    dates = [date for _, date in deduped]
+    statuses = list(deduped.values())
+
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
+            SELECT %s, u.ma, u.date, u.status, {_SERVER_ISO_NOW}, %s
+            FROM unnest(%s::text[], %s::text[], %s::text[]) AS u(ma, date, status)
+            ON CONFLICT (spreadsheet_id, ma, date)
+            DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at, updated_by_session = EXCLUDED.updated_by_session
+        ''', (spreadsheet_id, session_id, mas, dates, statuses))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[SYNC DEBUG] Batch saved %d attendance records, session=%s...",
+                     len(updates), session_id[:8] if session_id else 'none')
 
-    # PostgreSQL batch upsert using executemany
-    cursor.executemany('''
-        INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (spreadsheet_id, ma, date)
-        DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at, updated_by_session = EXCLUDED.updated_by_session
-    ''', values)
+def get_attendance(spreadsheet_id):
+    """Get all attendance data for a sheet as {ma: {date: status}}"""
+    # The nested dict is aggregated server-side with jsonb_object_agg -
+    # Postgres builds it in C and the driver hands back the finished dict,
+    # instead of shipping every row and assembling it in a Python loop
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT jsonb_object_agg(ma, statuses)
+            FROM (
+                SELECT ma, jsonb_object_agg(date, status) AS statuses
+                FROM attendance WHERE spreadsheet_id = %s
+                GROUP BY ma
+            ) t
+        ''', (spreadsheet_id,), binary=True)
+        row = cursor.fetchone()
 
-    print(f"[SYNC DEBUG] Batch saved {len(updates)} attendance records, session={session_id[:8] if session_id else 'none'}...")
+    # jsonb_object_agg over zero rows yields NULL
+    return row[0] if row and row[0] is not None else {}
 
-    conn.commit()
-    conn.close()
+def get_attendance_json(spreadsheet_id):
+    """Get all attendance data for a sheet as a ready-to-send JSON string.
 
-def get_attendance(spreadsheet_id):
-    """Get all attendance data for a sheet"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    cursor.execute('''
-        SELECT ma, date, status FROM attendance WHERE spreadsheet_id = %s
-    ''', (spreadsheet_id,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    # Convert to nested dict format: {ma: {date: status}}
-    attendance_data = {}
-    for row in rows:
-        ma = row['ma']
-        if ma not in attendance_data:
-            attendance_data[ma] = {}
-        attendance_data[ma][row['date']] = row['status']
+    For routes that just serialize get_attendance()'s dict straight back
+    out, this skips the dict round-trip entirely: the ::text cast returns
+    the aggregated JSON as-is, to be wrapped in
+    Response(..., mimetype='application/json').
+    """
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT jsonb_object_agg(ma, statuses)::text
+            FROM (
+                SELECT ma, jsonb_object_agg(date, status) AS statuses
+                FROM attendance WHERE spreadsheet_id = %s
+                GROUP BY ma
+            ) t
+        ''', (spreadsheet_id,), binary=True)
+        row = cursor.fetchone()
 
-    return attendance_data
+    return row[0] if row and row[0] is not None else '{}'
 
 def get_full_sheet_data(spreadsheet_id):
     """Get sheet, team members, and attendance in ONE connection - much faster!"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    with POOL.connection() as conn:
+        cursor = get_dict_cursor(conn)
 
-    # Get sheet info
-    cursor.execute('SELECT * FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    sheet_row = cursor.fetchone()
-    sheet = dict(sheet_row) if sheet_row else None
+        # Get sheet info
+        cursor.execute('SELECT * FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
+        sheet_row = cursor.fetchone()
+        sheet = dict(sheet_row) if sheet_row else None
 
-    if not sheet:
-        conn.close()
-        return None, [], {}
+        if not sheet:
+            return None, [], {}
 
-    # Get team members
-    cursor.execute('''
-        SELECT first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes
-        FROM team_members WHERE spreadsheet_id = %s
-    ''', (spreadsheet_id,))
-    member_rows = cursor.fetchall()
+        # Get team members
+        cursor.execute('''
+            SELECT first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes
+            FROM team_members WHERE spreadsheet_id = %s
+        ''', (spreadsheet_id,))
+        member_rows = cursor.fetchall()
+
+        # Get attendance
+        cursor.execute('''
+            SELECT ma, date, status FROM attendance WHERE spreadsheet_id = %s
+        ''', (spreadsheet_id,))
+        attendance_rows = cursor.fetchall()
 
     members = []
     for row in member_rows:
@@ -390,12 +458,6 @@ def get_full_sheet_data(spreadsheet_id):
             'notes': row.get('notes', '')
         })
 
-    # Get attendance
-    cursor.execute('''
-        SELECT ma, date, status FROM attendance WHERE spreadsheet_id = %s
-    ''', (spreadsheet_id,))
-    attendance_rows = cursor.fetchall()
-
     attendance_data = {}
     for row in attendance_rows:
         ma = row['ma']
@@ -403,77 +465,122 @@ def get_full_sheet_data(spreadsheet_id):
             attendance_data[ma] = {}
         attendance_data[ma][row['date']] = row['status']
 
-    conn.close()
     return sheet, members, attendance_data
 
 def get_attendance_changes_since(spreadsheet_id, since_timestamp, exclude_session_id=''):
     """Get attendance changes since a timestamp, optionally excluding changes by a specific session"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-
     try:
+        with POOL.connection() as conn:
+            cursor = get_dict_cursor(conn)
+
+            if exclude_session_id:
+                cursor.execute('''
+                    SELECT ma, date, status, updated_at, updated_by_session FROM attendance
+                    WHERE spreadsheet_id = %s AND updated_at > %s
+                    AND updated_by_session IS NOT NULL
+                    AND updated_by_session != ''
+                    AND updated_by_session != %s
+                ''', (spreadsheet_id, since_timestamp, exclude_session_id), binary=True)
+            else:
+                cursor.execute('''
+                    SELECT ma, date, status, updated_at FROM attendance
+                    WHERE spreadsheet_id = %s AND updated_at > %s
+                ''', (spreadsheet_id, since_timestamp), binary=True)
+
+            rows = cursor.fetchall()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[SYNC DEBUG] Query: since=%s, exclude_session=%s..., found=%d rows",
+                         since_timestamp, exclude_session_id[:8] if exclude_session_id else 'none', len(rows))
+
+        changes = []
+        for row in rows:
+            changes.append({
+                'ma': row['ma'],
+                'date': row['date'],
+                'status': row['status'],
+                'updated_at': row['updated_at']
+            })
+
+        return changes
+
+    except Exception as e:
+        logger.warning("get_attendance_changes_since error: %s", e)
+        return []
+
+def iter_attendance_changes_since(spreadsheet_id, since_timestamp, exclude_session_id='', limit=None):
+    """Stream attendance changes since a timestamp, yielding one dict per row.
+
+    Uses a named server-side cursor so a large delta (a client offline for
+    a while) is fetched in batches instead of materialized all at once -
+    peak memory stays O(batch), and the first rows are available before the
+    scan finishes. Pass limit to let clients page. Suitable for wrapping in
+    flask.stream_with_context; get_attendance_changes_since remains the
+    list-returning variant for small deltas.
+    """
+    with POOL.connection() as conn:
+        cursor = conn.cursor(name='attendance_changes', row_factory=dict_row)
+
         if exclude_session_id:
-            cursor.execute('''
+            sql = '''
                 SELECT ma, date, status, updated_at, updated_by_session FROM attendance
                 WHERE spreadsheet_id = %s AND updated_at > %s
                 AND updated_by_session IS NOT NULL
                 AND updated_by_session != ''
                 AND updated_by_session != %s
-            ''', (spreadsheet_id, since_timestamp, exclude_session_id))
+            '''
+            params = [spreadsheet_id, since_timestamp, exclude_session_id]
         else:
-            cursor.execute('''
+            sql = '''
                 SELECT ma, date, status, updated_at FROM attendance
                 WHERE spreadsheet_id = %s AND updated_at > %s
-            ''', (spreadsheet_id, since_timestamp))
-
-        rows = cursor.fetchall()
+            '''
+            params = [spreadsheet_id, since_timestamp]
 
-        print(f"[SYNC DEBUG] Query: since={since_timestamp}, exclude_session={exclude_session_id[:8] if exclude_session_id else 'none'}..., found={len(rows)} rows")
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(limit)
 
-        conn.close()
-
-        changes = []
-        for row in rows:
-            changes.append({
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield {
                 'ma': row['ma'],
                 'date': row['date'],
                 'status': row['status'],
                 'updated_at': row['updated_at']
-            })
-
-        return changes
-
-    except Exception as e:
-        print(f"Warning: get_attendance_changes_since error: {e}")
-        conn.close()
-        return []
+            }
 
 def get_server_timestamp():
-    """Get current server timestamp in ISO format"""
+    """Get current server timestamp in ISO format (process-local clock)"""
     return datetime.now().isoformat()
 
+def get_db_server_timestamp():
+    """Get the database server's timestamp in the same ISO text shape the
+    attendance rows use - for callers that need one clock across workers"""
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {_SERVER_ISO_NOW}')
+        return cursor.fetchone()[0]
+
 def get_all_sheets():
     """Get list of all sheets"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    cursor.execute('''
-        SELECT spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga, start_date, end_date, created_at
-        FROM sheets ORDER BY created_at DESC
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = get_dict_cursor(conn)
+        cursor.execute('''
+            SELECT spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga, start_date, end_date, created_at
+            FROM sheets ORDER BY created_at DESC
+        ''')
+        rows = cursor.fetchall()
     return [dict(row) for row in rows]
 
 def delete_sheet(spreadsheet_id):
     """Delete a sheet and all its data"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM attendance WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    cursor.execute('DELETE FROM active_users WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    cursor.execute('DELETE FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    conn.commit()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        # attendance/team_members/active_users all reference sheets with
+        # ON DELETE CASCADE, so one DELETE does the rest server-side -
+        # one round-trip instead of four
+        cursor.execute('DELETE FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
 
 # ============================================
 # Active Users Functions (for multi-worker support)
@@ -481,59 +588,119 @@ def delete_sheet(spreadsheet_id):
 
 ACTIVE_USER_TIMEOUT_SECONDS = 30
 
-def update_active_user(session_id, email, spreadsheet_id, last_seen):
-    """Update or insert an active user session"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO active_users (session_id, email, spreadsheet_id, last_seen)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (session_id) DO UPDATE SET email = EXCLUDED.email, spreadsheet_id = EXCLUDED.spreadsheet_id, last_seen = EXCLUDED.last_seen
-    ''', (session_id, email, spreadsheet_id, last_seen))
-    conn.commit()
-    conn.close()
+def update_active_user(session_id, email, spreadsheet_id, last_seen=None):
+    """Update or insert an active user session.
+
+    The heartbeat time is taken from the database clock; the last_seen
+    parameter is kept for signature compatibility but ignored.
+    """
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO active_users (session_id, email, spreadsheet_id, last_seen)
+            VALUES (%s, %s, %s, EXTRACT(EPOCH FROM NOW()))
+            ON CONFLICT (session_id) DO UPDATE SET email = EXCLUDED.email, spreadsheet_id = EXCLUDED.spreadsheet_id, last_seen = EXCLUDED.last_seen
+        ''', (session_id, email, spreadsheet_id))
+
+# The active-user read paths call cleanup on every poll; most of those calls
+# find nothing stale. Throttle so the DELETE goes out at most once per window.
+CLEANUP_INTERVAL_SECONDS = 10
+_last_cleanup = 0.0
 
 def cleanup_inactive_users():
-    """Remove users who haven't been seen recently"""
-    import time
-    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM active_users WHERE last_seen < %s', (cutoff,))
-    conn.commit()
-    conn.close()
+    """Remove users who haven't been seen recently (throttled)"""
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+        return
+    _last_cleanup = now
+    cutoff = now - ACTIVE_USER_TIMEOUT_SECONDS
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM active_users WHERE last_seen < %s', (cutoff,))
 
 def get_active_users_for_sheet(spreadsheet_id, exclude_session=None):
     """Get list of active user emails for a sheet, optionally excluding a session"""
-    cleanup_inactive_users()
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
+    # Stale-user cleanup is fused into the SELECT as a CTE - one round-trip
+    # per poll instead of a separate DELETE statement first
+    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
+    # Default tuple cursor - a one-column projection doesn't need dict rows
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
 
-    if exclude_session:
-        cursor.execute('''
-            SELECT email FROM active_users
-            WHERE spreadsheet_id = %s AND session_id != %s
-        ''', (spreadsheet_id, exclude_session))
-    else:
-        cursor.execute('''
-            SELECT email FROM active_users WHERE spreadsheet_id = %s
-        ''', (spreadsheet_id,))
+        if exclude_session:
+            cursor.execute('''
+                WITH deleted AS (
+                    DELETE FROM active_users WHERE last_seen < %s RETURNING 1
+                )
+                SELECT email FROM active_users
+                WHERE spreadsheet_id = %s AND session_id != %s AND last_seen >= %s
+            ''', (cutoff, spreadsheet_id, exclude_session, cutoff))
+        else:
+            cursor.execute('''
+                WITH deleted AS (
+                    DELETE FROM active_users WHERE last_seen < %s RETURNING 1
+                )
+                SELECT email FROM active_users
+                WHERE spreadsheet_id = %s AND last_seen >= %s
+            ''', (cutoff, spreadsheet_id, cutoff))
 
-    rows = cursor.fetchall()
-    conn.close()
-    return [row['email'] for row in rows]
+        rows = cursor.fetchall()
+    return [row[0] for row in rows]
 
 def get_all_active_users_for_sheet(spreadsheet_id):
     """Get all active users for a sheet (including current session)"""
-    cleanup_inactive_users()
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    cursor.execute('''
-        SELECT email FROM active_users WHERE spreadsheet_id = %s
-    ''', (spreadsheet_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [row['email'] for row in rows]
+    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
+    with POOL.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            WITH deleted AS (
+                DELETE FROM active_users WHERE last_seen < %s RETURNING 1
+            )
+            SELECT email FROM active_users
+            WHERE spreadsheet_id = %s AND last_seen >= %s
+        ''', (cutoff, spreadsheet_id, cutoff))
+        rows = cursor.fetchall()
+    return [row[0] for row in rows]
+
+def poll_sync(session_id, email, spreadsheet_id, exclude_session=None):
+    """Run one client poll tick - heartbeat upsert, data version read, and
+    active-user listing - in a single network round-trip.
+
+    Pipeline mode queues all three statements and flushes them together,
+    instead of the three separate calls (and RTTs) the route used to make.
+    Returns (version, emails).
+    """
+    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
+    with POOL.connection() as conn:
+        with conn.pipeline():
+            heartbeat_cursor = conn.cursor()
+            heartbeat_cursor.execute('''
+                INSERT INTO active_users (session_id, email, spreadsheet_id, last_seen)
+                VALUES (%s, %s, %s, EXTRACT(EPOCH FROM NOW()))
+                ON CONFLICT (session_id) DO UPDATE SET email = EXCLUDED.email, spreadsheet_id = EXCLUDED.spreadsheet_id, last_seen = EXCLUDED.last_seen
+            ''', (session_id, email, spreadsheet_id))
+
+            version_cursor = conn.cursor()
+            version_cursor.execute('SELECT version FROM data_version WHERE id = 1')
+
+            users_cursor = conn.cursor()
+            if exclude_session:
+                users_cursor.execute('''
+                    SELECT email FROM active_users
+                    WHERE spreadsheet_id = %s AND session_id != %s AND last_seen >= %s
+                ''', (spreadsheet_id, exclude_session, cutoff))
+            else:
+                users_cursor.execute('''
+                    SELECT email FROM active_users
+                    WHERE spreadsheet_id = %s AND last_seen >= %s
+                ''', (spreadsheet_id, cutoff))
+
+        version_row = version_cursor.fetchone()
+        version = version_row[0] if version_row else 1
+        emails = [row[0] for row in users_cursor.fetchall()]
+
+    return version, emails
 
 # ============================================
 # Backwards compatibility functions
@@ -541,14 +708,26 @@ def get_all_active_users_for_sheet(spreadsheet_id):
 
 def get_sheet_id_by_google_identifiers(spreadsheet_id, sheet_name='', gdud='', pluga=''):
     """Get sheet by Google spreadsheet_id - returns spreadsheet_id itself for backwards compatibility"""
-    conn = get_db_connection()
-    cursor = get_dict_cursor(conn)
-    cursor.execute('SELECT spreadsheet_id FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with POOL.connection() as conn:
+        cursor = get_dict_cursor(conn)
+        cursor.execute('SELECT spreadsheet_id FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
+        row = cursor.fetchone()
     if row:
         return row['spreadsheet_id']
     return None
 
-# Initialize database when module is imported
-init_database()
+# Initialize the schema once per host, not once per worker: the CREATE
+# TABLE/INDEX batch costs ~14 round-trips, and every gunicorn worker was
+# paying it at import. A flag file marks it done for subsequent workers.
+# Set AUTO_INIT_DB=0 to skip entirely (schema managed at deploy time).
+_INIT_FLAG_FILE = '/tmp/.attendance_db_inited'
+
+if os.environ.get('AUTO_INIT_DB', '1') == '1' and not os.path.exists(_INIT_FLAG_FILE):
+    init_database()
+    try:
+        open(_INIT_FLAG_FILE, 'w').close()
+    except OSError:
+        pass  # read-only /tmp - just re-run init next boot
+
+# Pre-warm the pool so the first request doesn't pay cold-connection cost
+POOL.wait()
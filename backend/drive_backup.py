@@ -3,9 +3,13 @@ Google Drive Backup Module
 Handles uploading and downloading database backups to/from Google Drive
 Uses OAuth with stored refresh token for admin-authorized backups
 """
+import gzip
 import os
 import io
 import json
+import shutil
+import threading
+import time
 from datetime import datetime
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
@@ -13,6 +17,13 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 from googleapiclient.errors import HttpError
 
+# C-backed JSON when available, for parsing stored token blobs
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 # Backup folder name in Google Drive
 BACKUP_FOLDER_NAME = 'AttendanceManager_Backups'
 DATABASE_FILE = 'data/attendance.db'
@@ -32,7 +43,7 @@ def get_stored_credentials():
     token_json = os.environ.get('GOOGLE_DRIVE_TOKEN')
     if token_json:
         try:
-            token_data = json.loads(token_json)
+            token_data = _loads(token_json)
             creds = Credentials(
                 token=token_data.get('access_token'),
                 refresh_token=token_data.get('refresh_token'),
@@ -53,7 +64,7 @@ def get_stored_credentials():
     if os.path.exists(TOKEN_FILE):
         try:
             with open(TOKEN_FILE, 'r') as f:
-                token_data = json.load(f)
+                token_data = _loads(f.read())
             creds = Credentials(
                 token=token_data.get('access_token'),
                 refresh_token=token_data.get('refresh_token'),
@@ -124,21 +135,106 @@ def authorize_drive_backup(auth_code):
         return {'success': False, 'error': str(e)}
 
 
+# Credentials and the built service are cached at module scope: loading creds
+# re-parses token JSON and building the service parses the Drive discovery
+# document, neither of which changes between calls
+_drive_creds_cache = None
+_drive_service_cache = None
+_drive_lock = threading.Lock()
+_refresher_thread = None
+
+
+def _get_cached_credentials():
+    """Get cached OAuth credentials, loading or refreshing as needed.
+
+    Caller must hold _drive_lock.
+    """
+    global _drive_creds_cache, _drive_service_cache
+    creds = _drive_creds_cache
+    if creds is not None and creds.expired and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+            if os.path.exists(TOKEN_FILE):
+                save_credentials(creds)
+            _drive_service_cache = None  # rebuild with the fresh token
+        except Exception as e:
+            print(f"Error refreshing Drive token: {e}")
+            creds = None
+    if creds is None or creds.expired:
+        creds = get_stored_credentials()
+        _drive_creds_cache = creds
+        _drive_service_cache = None
+    return creds
+
+
+def _token_refresh_loop():
+    """Refresh the cached token shortly before expiry, off the request path"""
+    global _drive_service_cache
+    while True:
+        time.sleep(60)
+        try:
+            with _drive_lock:
+                creds = _drive_creds_cache
+                if creds and creds.expiry and creds.refresh_token:
+                    remaining = (creds.expiry - datetime.utcnow()).total_seconds()
+                    if remaining < 300:
+                        creds.refresh(Request())
+                        if os.path.exists(TOKEN_FILE):
+                            save_credentials(creds)
+                        _drive_service_cache = None
+        except Exception as e:
+            print(f"Error in Drive token refresher: {e}")
+
+
+def start_token_refresher():
+    """Start the background token refresher thread (idempotent)"""
+    global _refresher_thread
+    if _refresher_thread is None or not _refresher_thread.is_alive():
+        _refresher_thread = threading.Thread(target=_token_refresh_loop, daemon=True)
+        _refresher_thread.start()
+
+
 def get_drive_service():
-    """Create a Google Drive service instance using stored credentials"""
-    creds = get_stored_credentials()
-    if not creds:
-        return None
-    return build('drive', 'v3', credentials=creds)
+    """Get a Google Drive service instance (cached) using stored credentials"""
+    global _drive_service_cache
+    with _drive_lock:
+        creds = _get_cached_credentials()
+        if not creds:
+            return None
+        if _drive_service_cache is None:
+            # static_discovery uses the discovery doc bundled with the
+            # client library instead of fetching it over HTTP
+            _drive_service_cache = build('drive', 'v3', credentials=creds,
+                                         cache_discovery=False, static_discovery=True)
+        service = _drive_service_cache
+    # Keep the token warm so later calls don't pay the refresh roundtrip
+    start_token_refresher()
+    return service
 
 
 def is_drive_configured():
     """Check if Google Drive backup is properly configured"""
-    return get_stored_credentials() is not None
+    with _drive_lock:
+        return _get_cached_credentials() is not None
+
+
+# The backup folder id never changes for the authorized account, so cache it
+# and skip one Drive list roundtrip per backup operation
+_folder_cache = {'id': None, 'expiry': 0.0}
+FOLDER_CACHE_TTL_SECONDS = 3600
+
+
+def _invalidate_folder_cache():
+    """Drop the cached folder id (e.g. after a Drive error)"""
+    _folder_cache['id'] = None
 
 
 def get_or_create_backup_folder(service):
-    """Get or create the backup folder in Google Drive"""
+    """Get or create the backup folder in Google Drive (cached for an hour)"""
+    now = time.time()
+    if _folder_cache['id'] and now < _folder_cache['expiry']:
+        return _folder_cache['id']
+
     # Search for existing folder
     query = f"name='{BACKUP_FOLDER_NAME}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
     results = service.files().list(
@@ -149,19 +245,35 @@ def get_or_create_backup_folder(service):
     files = results.get('files', [])
 
     if files:
-        return files[0]['id']
+        folder_id = files[0]['id']
+    else:
+        # Create folder if not found
+        folder_metadata = {
+            'name': BACKUP_FOLDER_NAME,
+            'mimeType': 'application/vnd.google-apps.folder'
+        }
+        folder = service.files().create(body=folder_metadata, fields='id').execute()
+        folder_id = folder['id']
 
-    # Create folder if not found
-    folder_metadata = {
-        'name': BACKUP_FOLDER_NAME,
-        'mimeType': 'application/vnd.google-apps.folder'
-    }
-    folder = service.files().create(body=folder_metadata, fields='id').execute()
-    return folder['id']
+    _folder_cache['id'] = folder_id
+    _folder_cache['expiry'] = now + FOLDER_CACHE_TTL_SECONDS
+    return folder_id
+
+
+def _compress_to_tmp(path):
+    """Gzip-compress a file to a temp .gz next to it, returning the temp path.
+
+    SQLite files compress several-fold (sparse pages, text columns), so the
+    backup crosses the network and sits in Drive at a fraction of its raw size.
+    """
+    tmp_path = path + '.gz_tmp'
+    with open(path, 'rb') as fi, gzip.open(tmp_path, 'wb', compresslevel=6) as fo:
+        shutil.copyfileobj(fi, fo, length=1 << 20)
+    return tmp_path
 
 
 def upload_backup_to_drive():
-    """Upload current database to Google Drive"""
+    """Upload current database to Google Drive (gzip-compressed)"""
     if not os.path.exists(DATABASE_FILE):
         return {'success': False, 'error': 'Database file not found'}
 
@@ -169,25 +281,33 @@ def upload_backup_to_drive():
     if not service:
         return {'success': False, 'error': 'Google Drive not configured. Admin needs to authorize Drive backup first.'}
 
+    tmp_path = None
     try:
         folder_id = get_or_create_backup_folder(service)
 
         # Generate backup filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_name = f'attendance_backup_{timestamp}.db'
+        backup_name = f'attendance_backup_{timestamp}.db.gz'
 
         # Upload file
         file_metadata = {
             'name': backup_name,
             'parents': [folder_id]
         }
-        media = MediaFileUpload(DATABASE_FILE, mimetype='application/x-sqlite3')
+        # Resumable chunked upload: streams the file in 1MB pieces instead of
+        # buffering it in one request body
+        tmp_path = _compress_to_tmp(DATABASE_FILE)
+        media = MediaFileUpload(tmp_path, mimetype='application/gzip',
+                                resumable=True, chunksize=1024 * 1024)
 
-        file = service.files().create(
+        request = service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id, name, createdTime, size'
-        ).execute()
+        )
+        file = None
+        while file is None:
+            status, file = request.next_chunk()
 
         return {
             'success': True,
@@ -199,9 +319,17 @@ def upload_backup_to_drive():
             }
         }
     except HttpError as e:
+        # The cached folder may have been trashed - re-resolve next call
+        _invalidate_folder_cache()
         return {'success': False, 'error': str(e)}
     except Exception as e:
         return {'success': False, 'error': str(e)}
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
 
 def list_drive_backups():
@@ -213,34 +341,24 @@ def list_drive_backups():
     try:
         folder_id = get_or_create_backup_folder(service)
 
-        # List files in backup folder
+        # List files in backup folder, paging so large backup sets aren't
+        # silently truncated at the default page size
         query = f"'{folder_id}' in parents and trashed=false and name contains 'attendance_backup_'"
-        results = service.files().list(
-            q=query,
-            spaces='drive',
-            fields='files(id, name, createdTime, size)',
-            orderBy='createdTime desc'
-        ).execute()
-
-        files = results.get('files', [])
-
-        # Parse timestamps from filenames
         backups = []
-        for f in files:
-            # Extract timestamp from filename
-            name = f['name']
-            timestamp_str = name.replace('attendance_backup_', '').replace('.db', '')
-            try:
-                timestamp = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                backups.append({
-                    'id': f['id'],
-                    'filename': f['name'],
-                    'timestamp': timestamp.isoformat(),
-                    'size': int(f.get('size', 0)),
-                    'source': 'drive'
-                })
-            except ValueError:
-                # If timestamp parsing fails, use createdTime
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=query,
+                spaces='drive',
+                pageSize=1000,
+                fields='nextPageToken, files(id, name, createdTime, size)',
+                orderBy='createdTime desc',
+                pageToken=page_token
+            ).execute()
+
+            # Drive's createdTime is already ISO 8601 - no per-file
+            # strptime of the filename needed
+            for f in results.get('files', []):
                 backups.append({
                     'id': f['id'],
                     'filename': f['name'],
@@ -249,8 +367,13 @@ def list_drive_backups():
                     'source': 'drive'
                 })
 
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
         return {'success': True, 'backups': backups}
     except HttpError as e:
+        _invalidate_folder_cache()
         return {'success': False, 'error': str(e), 'backups': []}
     except Exception as e:
         return {'success': False, 'error': str(e), 'backups': []}
@@ -269,7 +392,8 @@ def download_backup_from_drive(file_id):
         # Download file content
         request = service.files().get_media(fileId=file_id)
         content = io.BytesIO()
-        downloader = MediaIoBaseDownload(content, request)
+        # Default 100KB chunks make a multi-MB restore dozens of roundtrips
+        downloader = MediaIoBaseDownload(content, request, chunksize=16 * 1024 * 1024)
 
         done = False
         while not done:
@@ -287,6 +411,31 @@ def download_backup_from_drive(file_id):
         return {'success': False, 'error': str(e)}
 
 
+def download_backup_to_file(file_id, dest_path):
+    """Stream a backup from Google Drive straight to a file on disk"""
+    service = get_drive_service()
+    if not service:
+        return {'success': False, 'error': 'Google Drive not configured'}
+
+    try:
+        file_metadata = service.files().get(fileId=file_id, fields='name').execute()
+
+        request = service.files().get_media(fileId=file_id)
+        with open(dest_path, 'wb') as f:
+            downloader = MediaIoBaseDownload(f, request, chunksize=16 * 1024 * 1024)
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
+            f.flush()
+            os.fsync(f.fileno())
+
+        return {'success': True, 'filename': file_metadata['name']}
+    except HttpError as e:
+        return {'success': False, 'error': str(e)}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
 def restore_from_drive(file_id):
     """Restore database from a Google Drive backup"""
     import database as db
@@ -294,34 +443,80 @@ def restore_from_drive(file_id):
     # First, create a local backup of current state
     db.create_backup()
 
-    # Download the backup from Drive
-    result = download_backup_from_drive(file_id)
+    # Stream the backup to a temp file next to the database, then swap it in
+    # atomically - the download never passes through memory and a failed
+    # download can't leave a half-written database behind
+    tmp_path = DATABASE_FILE + '.restore_tmp'
+    result = download_backup_to_file(file_id, tmp_path)
     if not result['success']:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return result
 
     try:
-        # Write the downloaded content to the database file
-        with open(DATABASE_FILE, 'wb') as f:
-            f.write(result['content'])
+        if result['filename'].endswith('.gz'):
+            # New backups are gzipped - decompress to a second temp file so
+            # the swap below stays atomic; older raw .db backups still work
+            plain_path = tmp_path + '.plain'
+            with gzip.open(tmp_path, 'rb') as fi, open(plain_path, 'wb') as fo:
+                shutil.copyfileobj(fi, fo, length=1 << 20)
+                fo.flush()
+                os.fsync(fo.fileno())
+            os.remove(tmp_path)
+            tmp_path = plain_path
+
+        os.replace(tmp_path, DATABASE_FILE)
 
         return {
             'success': True,
             'message': f"Restored from {result['filename']}"
         }
     except Exception as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return {'success': False, 'error': str(e)}
 
 
-def delete_drive_backup(file_id):
-    """Delete a backup from Google Drive"""
+def delete_drive_backups(file_ids):
+    """Delete multiple backups from Google Drive in one batch request.
+
+    Drive batches up to 100 metadata operations per HTTP roundtrip, so bulk
+    retention pruning costs one request instead of one per file.
+    """
     service = get_drive_service()
     if not service:
         return {'success': False, 'error': 'Google Drive not configured'}
 
+    errors = []
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            errors.append(str(exception))
+
     try:
-        service.files().delete(fileId=file_id).execute()
-        return {'success': True}
+        ids = list(file_ids)
+        for start in range(0, len(ids), 100):
+            batch = service.new_batch_http_request(callback=_collect)
+            for fid in ids[start:start + 100]:
+                batch.add(service.files().delete(fileId=fid))
+            batch.execute()
+
+        if errors:
+            return {'success': False, 'error': '; '.join(errors)}
+        return {'success': True, 'deleted': len(ids)}
     except HttpError as e:
         return {'success': False, 'error': str(e)}
     except Exception as e:
         return {'success': False, 'error': str(e)}
+
+
+def delete_drive_backup(file_id):
+    """Delete a backup from Google Drive"""
+    result = delete_drive_backups([file_id])
+    if result.get('success'):
+        return {'success': True}
+    return result
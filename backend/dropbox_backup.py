@@ -3,10 +3,28 @@ Dropbox Backup Module
 Handles uploading and downloading database backups to/from Dropbox
 Uses a simple access token for authentication
 """
+import gzip
 import os
 import json
+import re
+import shutil
 import requests
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# C-backed JSON when available - every API call encodes a Dropbox-API-Arg
+# header and decodes a response body
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
 
 # Backup folder path in Dropbox (empty for App folder root)
 BACKUP_FOLDER = ''
@@ -17,12 +35,34 @@ TOKEN_FILE = 'data/dropbox_token.json'
 DROPBOX_API_URL = 'https://api.dropboxapi.com/2'
 DROPBOX_CONTENT_URL = 'https://content.dropboxapi.com/2'
 
+# Matches backup filenames and captures the timestamp in one pass
+_BACKUP_RE = re.compile(r'^attendance_backup_(\d{8}_\d{6})\.db(\.gz)?$')
+
+# Shared session: keep-alive skips the TCP+TLS handshake on every call after
+# the first, and transient failures retry with backoff
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+
+# The token doesn't change between calls, so cache it after the first
+# env/file lookup; invalidate_dropbox_token() handles rotations
+_cached_dropbox_token = None
+
 
 def get_access_token():
-    """Get Dropbox access token from environment or file"""
+    """Get Dropbox access token from environment or file (cached)"""
+    global _cached_dropbox_token
+    if _cached_dropbox_token:
+        return _cached_dropbox_token
+
     # Try environment variable first (for production/Render)
     token = os.environ.get('DROPBOX_ACCESS_TOKEN')
     if token:
+        _cached_dropbox_token = token
         return token
 
     # Try loading from file (for local development)
@@ -30,18 +70,27 @@ def get_access_token():
         try:
             with open(TOKEN_FILE, 'r') as f:
                 data = json.load(f)
-                return data.get('access_token')
+                _cached_dropbox_token = data.get('access_token')
+                return _cached_dropbox_token
         except Exception as e:
             print(f"Error loading Dropbox token: {e}")
 
     return None
 
 
+def invalidate_dropbox_token():
+    """Drop the cached token so the next call re-reads env/file"""
+    global _cached_dropbox_token
+    _cached_dropbox_token = None
+
+
 def save_access_token(token):
     """Save Dropbox access token to file for local development"""
+    global _cached_dropbox_token
     os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
     with open(TOKEN_FILE, 'w') as f:
         json.dump({'access_token': token}, f)
+    _cached_dropbox_token = token
 
 
 def is_dropbox_configured():
@@ -58,8 +107,20 @@ def _get_headers():
     }
 
 
+def _compress_to_tmp(path):
+    """Gzip-compress a file to a temp .gz next to it, returning the temp path.
+
+    SQLite files compress several-fold, so the backup crosses the network
+    and sits in Dropbox at a fraction of its raw size.
+    """
+    tmp_path = path + '.gz_tmp'
+    with open(path, 'rb') as fi, gzip.open(tmp_path, 'wb', compresslevel=6) as fo:
+        shutil.copyfileobj(fi, fo, length=1 << 20)
+    return tmp_path
+
+
 def upload_backup_to_dropbox():
-    """Upload current database to Dropbox"""
+    """Upload current database to Dropbox (gzip-compressed)"""
     if not os.path.exists(DATABASE_FILE):
         return {'success': False, 'error': 'Database file not found'}
 
@@ -67,21 +128,21 @@ def upload_backup_to_dropbox():
     if not token:
         return {'success': False, 'error': 'Dropbox not configured. Set DROPBOX_ACCESS_TOKEN environment variable.'}
 
+    tmp_path = None
     try:
         # Generate backup filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_name = f'attendance_backup_{timestamp}.db'
+        backup_name = f'attendance_backup_{timestamp}.db.gz'
         dropbox_path = f'/{backup_name}'  # Root of app folder
 
-        # Read database file
-        with open(DATABASE_FILE, 'rb') as f:
-            file_content = f.read()
+        tmp_path = _compress_to_tmp(DATABASE_FILE)
 
         # Upload to Dropbox
         headers = {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/octet-stream',
-            'Dropbox-API-Arg': json.dumps({
+            'Content-Length': str(os.path.getsize(tmp_path)),
+            'Dropbox-API-Arg': _dumps({
                 'path': dropbox_path,
                 'mode': 'add',
                 'autorename': True,
@@ -89,14 +150,17 @@ def upload_backup_to_dropbox():
             })
         }
 
-        response = requests.post(
-            f'{DROPBOX_CONTENT_URL}/files/upload',
-            headers=headers,
-            data=file_content
-        )
+        # Stream the file handle instead of buffering the whole backup in
+        # memory - requests reads it in chunks as the socket drains
+        with open(tmp_path, 'rb') as f:
+            response = _session.post(
+                f'{DROPBOX_CONTENT_URL}/files/upload',
+                headers=headers,
+                data=f
+            )
 
         if response.status_code == 200:
-            result = response.json()
+            result = _loads(response.content)
             return {
                 'success': True,
                 'file': {
@@ -108,7 +172,7 @@ def upload_backup_to_dropbox():
             }
         else:
             try:
-                error_data = response.json()
+                error_data = _loads(response.content)
                 error_msg = error_data.get('error_summary', str(error_data))
             except:
                 error_msg = f'HTTP {response.status_code}: {response.text}'
@@ -116,6 +180,12 @@ def upload_backup_to_dropbox():
 
     except Exception as e:
         return {'success': False, 'error': str(e)}
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
 
 def list_dropbox_backups():
@@ -128,46 +198,45 @@ def list_dropbox_backups():
         headers = _get_headers()
 
         # List files in backup folder
-        response = requests.post(
+        response = _session.post(
             f'{DROPBOX_API_URL}/files/list_folder',
             headers=headers,
-            json={
+            data=_dumps({
                 'path': BACKUP_FOLDER,
                 'recursive': False,
                 'include_deleted': False
-            }
+            })
         )
 
         if response.status_code == 200:
-            result = response.json()
+            result = _loads(response.content)
             entries = result.get('entries', [])
 
             backups = []
             for entry in entries:
-                if entry.get('.tag') == 'file' and entry.get('name', '').startswith('attendance_backup_'):
-                    name = entry['name']
-                    # Extract timestamp from filename
-                    timestamp_str = name.replace('attendance_backup_', '').replace('.db', '')
-                    try:
-                        timestamp = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                        backups.append({
-                            'id': entry.get('id'),
-                            'filename': name,
-                            'path': entry.get('path_display'),
-                            'timestamp': timestamp.isoformat(),
-                            'size': entry.get('size', 0),
-                            'source': 'dropbox'
-                        })
-                    except ValueError:
-                        # Use server_modified if timestamp parsing fails
-                        backups.append({
-                            'id': entry.get('id'),
-                            'filename': name,
-                            'path': entry.get('path_display'),
-                            'timestamp': entry.get('server_modified', ''),
-                            'size': entry.get('size', 0),
-                            'source': 'dropbox'
-                        })
+                if entry.get('.tag') != 'file':
+                    continue
+                name = entry.get('name', '')
+                # One compiled-regex match instead of prefix check plus
+                # double str.replace per file
+                m = _BACKUP_RE.match(name)
+                if m:
+                    timestamp = datetime.strptime(m.group(1), '%Y%m%d_%H%M%S').isoformat()
+                elif name.startswith('attendance_backup_'):
+                    # Uploads use autorename, so collisions yield names like
+                    # 'attendance_backup_..._ (1).db.gz' - still real backups;
+                    # fall back to the server timestamp for them
+                    timestamp = entry.get('server_modified', '')
+                else:
+                    continue
+                backups.append({
+                    'id': entry.get('id'),
+                    'filename': name,
+                    'path': entry.get('path_display'),
+                    'timestamp': timestamp,
+                    'size': entry.get('size', 0),
+                    'source': 'dropbox'
+                })
 
             # Sort by timestamp descending
             backups.sort(key=lambda x: x['timestamp'], reverse=True)
@@ -175,12 +244,12 @@ def list_dropbox_backups():
 
         elif response.status_code == 409:
             # Folder doesn't exist yet - that's ok, just no backups
-            error = response.json().get('error', {})
+            error = _loads(response.content).get('error', {})
             if 'path' in error and 'not_found' in str(error):
                 return {'success': True, 'backups': []}
-            return {'success': False, 'error': response.json().get('error_summary', 'Unknown error'), 'backups': []}
+            return {'success': False, 'error': _loads(response.content).get('error_summary', 'Unknown error'), 'backups': []}
         else:
-            return {'success': False, 'error': response.json().get('error_summary', response.text), 'backups': []}
+            return {'success': False, 'error': _loads(response.content).get('error_summary', response.text), 'backups': []}
 
     except Exception as e:
         return {'success': False, 'error': str(e), 'backups': []}
@@ -195,17 +264,17 @@ def download_backup_from_dropbox(file_path):
     try:
         headers = {
             'Authorization': f'Bearer {token}',
-            'Dropbox-API-Arg': json.dumps({'path': file_path})
+            'Dropbox-API-Arg': _dumps({'path': file_path})
         }
 
-        response = requests.post(
+        response = _session.post(
             f'{DROPBOX_CONTENT_URL}/files/download',
             headers=headers
         )
 
         if response.status_code == 200:
             # Get filename from response header
-            api_result = json.loads(response.headers.get('Dropbox-API-Result', '{}'))
+            api_result = _loads(response.headers.get('Dropbox-API-Result', '{}'))
             return {
                 'success': True,
                 'filename': api_result.get('name', 'backup.db'),
@@ -225,21 +294,58 @@ def restore_from_dropbox(file_path):
     # First, create a local backup of current state
     db.create_backup()
 
-    # Download the backup from Dropbox
-    result = download_backup_from_dropbox(file_path)
-    if not result['success']:
-        return result
+    token = get_access_token()
+    if not token:
+        return {'success': False, 'error': 'Dropbox not configured'}
 
+    # Stream the download straight to a temp file and swap it in atomically -
+    # the backup never sits in memory and a failed download can't leave a
+    # half-written database behind
+    tmp_path = DATABASE_FILE + '.restore_tmp'
     try:
-        # Write the downloaded content to the database file
-        with open(DATABASE_FILE, 'wb') as f:
-            f.write(result['content'])
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Dropbox-API-Arg': _dumps({'path': file_path})
+        }
+
+        response = _session.post(
+            f'{DROPBOX_CONTENT_URL}/files/download',
+            headers=headers,
+            stream=True
+        )
+
+        if response.status_code != 200:
+            return {'success': False, 'error': response.text}
+
+        api_result = _loads(response.headers.get('Dropbox-API-Result', '{}'))
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if api_result.get('name', file_path).endswith('.gz'):
+            # New backups are gzipped - decompress to a second temp file so
+            # the swap below stays atomic; older raw .db backups still work
+            plain_path = tmp_path + '.plain'
+            with gzip.open(tmp_path, 'rb') as fi, open(plain_path, 'wb') as fo:
+                shutil.copyfileobj(fi, fo, length=1 << 20)
+                fo.flush()
+                os.fsync(fo.fileno())
+            os.remove(tmp_path)
+            tmp_path = plain_path
+
+        os.replace(tmp_path, DATABASE_FILE)
 
         return {
             'success': True,
-            'message': f"Restored from {result['filename']}"
+            'message': f"Restored from {api_result.get('name', 'backup.db')}"
         }
     except Exception as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return {'success': False, 'error': str(e)}
 
 
@@ -252,16 +358,16 @@ def delete_dropbox_backup(file_path):
     try:
         headers = _get_headers()
 
-        response = requests.post(
+        response = _session.post(
             f'{DROPBOX_API_URL}/files/delete_v2',
             headers=headers,
-            json={'path': file_path}
+            data=_dumps({'path': file_path})
         )
 
         if response.status_code == 200:
             return {'success': True}
         else:
-            return {'success': False, 'error': response.json().get('error_summary', response.text)}
+            return {'success': False, 'error': _loads(response.content).get('error_summary', response.text)}
 
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -3,9 +3,10 @@
 # Sends verification codes via email
 # ============================================
 
+import heapq
+import secrets
 import smtplib
-import random
-import string
+import threading
 import time
 import os
 from email.mime.text import MIMEText
@@ -26,6 +27,13 @@ pending_codes = {}
 # Format: {session_token: {'email': 'user@example.com', 'expires': timestamp}}
 verified_sessions = {}
 
+# Min-heaps of (expires, key) so cleanup_expired only touches entries that
+# are actually due instead of scanning every dict entry. Entries can go
+# stale (code re-issued, session logged out) - cleanup cross-checks the
+# stored expiry before deleting.
+_code_expiry_heap = []
+_session_expiry_heap = []
+
 # Configuration
 CODE_LENGTH = 6
 CODE_EXPIRY_SECONDS = 300  # 5 minutes
@@ -42,8 +50,46 @@ def generate_code():
 
 
 def generate_session_token():
-    """Generate a random session token"""
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=32))
+    """Generate a random session token (CSPRNG, one C-level draw)"""
+    return secrets.token_urlsafe(24)
+
+
+# Pooled SMTP connection: the TLS handshake plus AUTH costs several round
+# trips to smtp.gmail.com, so keep one connection per worker and only
+# reconnect when it goes stale
+_smtp_conn = None
+_smtp_lock = threading.Lock()
+
+
+def _drop_smtp():
+    """Discard the pooled SMTP connection (caller must hold _smtp_lock)"""
+    global _smtp_conn
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.close()
+        except Exception:
+            pass
+        _smtp_conn = None
+
+
+def _get_smtp():
+    """Get the pooled SMTP connection, reconnecting if it went stale.
+
+    Caller must hold _smtp_lock.
+    """
+    global _smtp_conn
+    if _smtp_conn is not None:
+        try:
+            if _smtp_conn.noop()[0] == 250:
+                return _smtp_conn
+        except Exception:
+            pass
+        _drop_smtp()
+    conn = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10)
+    conn.starttls()
+    conn.login(SENDER_EMAIL, SENDER_APP_PASSWORD)
+    _smtp_conn = conn
+    return conn
 
 
 def send_verification_email(to_email, code):
@@ -96,11 +142,13 @@ def send_verification_email(to_email, code):
         msg.attach(part1)
         msg.attach(part2)
 
-        # Send email with timeout
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_APP_PASSWORD)
-            server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
+        # Send over the pooled connection; reconnect once if it died mid-send
+        with _smtp_lock:
+            try:
+                _get_smtp().sendmail(SENDER_EMAIL, to_email, msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                _drop_smtp()
+                _get_smtp().sendmail(SENDER_EMAIL, to_email, msg.as_string())
 
         print(f"Verification email sent to {to_email}")
         return True, "Email sent"
@@ -130,6 +178,7 @@ def request_verification_code(email):
         'expires': expires,
         'attempts': 0
     }
+    heapq.heappush(_code_expiry_heap, (expires, email))
 
     print(f"Access code requested for {email}")
     return True, "הזן את קוד הגישה"
@@ -139,12 +188,11 @@ def verify_code(email, code):
     """Verify a code and create a session if valid"""
     email = email.lower().strip()
 
-    # Check if code exists
-    if email not in pending_codes:
+    # Check if code exists (single lookup instead of `in` + index)
+    stored = pending_codes.get(email)
+    if stored is None:
         return False, None, "לא נמצא קוד אימות - בקש קוד חדש"
 
-    stored = pending_codes[email]
-
     # Check if expired
     if time.time() > stored['expires']:
         del pending_codes[email]
@@ -164,24 +212,30 @@ def verify_code(email, code):
     # Code is valid - create session
     del pending_codes[email]
     session_token = generate_session_token()
+    session_expires = time.time() + SESSION_EXPIRY_SECONDS
     verified_sessions[session_token] = {
         'email': email,
-        'expires': time.time() + SESSION_EXPIRY_SECONDS
+        'expires': session_expires
     }
+    heapq.heappush(_session_expiry_heap, (session_expires, session_token))
 
     return True, session_token, "אומת בהצלחה"
 
 
 def validate_session(session_token):
     """Validate a session token and return the email if valid"""
-    if not session_token or session_token not in verified_sessions:
+    if not session_token:
         return None
 
-    session = verified_sessions[session_token]
+    # Single lookup on the auth hot path - this runs on every
+    # authenticated request
+    session = verified_sessions.get(session_token)
+    if session is None:
+        return None
 
     # Check if expired
     if time.time() > session['expires']:
-        del verified_sessions[session_token]
+        verified_sessions.pop(session_token, None)
         return None
 
     return session['email']
@@ -189,24 +243,24 @@ def validate_session(session_token):
 
 def logout(session_token):
     """Invalidate a session"""
-    if session_token in verified_sessions:
-        del verified_sessions[session_token]
-        return True
-    return False
+    return verified_sessions.pop(session_token, None) is not None
 
 
 def cleanup_expired():
     """Clean up expired codes and sessions"""
     current_time = time.time()
 
-    # Clean expired codes
-    expired_codes = [email for email, data in pending_codes.items()
-                    if current_time > data['expires']]
-    for email in expired_codes:
-        del pending_codes[email]
-
-    # Clean expired sessions
-    expired_sessions = [token for token, data in verified_sessions.items()
-                       if current_time > data['expires']]
-    for token in expired_sessions:
-        del verified_sessions[token]
+    # Pop only due entries off the heaps - O(1) when nothing has expired.
+    # The expiry match skips heap entries made stale by re-issued codes,
+    # successful verification or logout.
+    while _code_expiry_heap and _code_expiry_heap[0][0] < current_time:
+        expires, email = heapq.heappop(_code_expiry_heap)
+        data = pending_codes.get(email)
+        if data and data['expires'] == expires:
+            del pending_codes[email]
+
+    while _session_expiry_heap and _session_expiry_heap[0][0] < current_time:
+        expires, token = heapq.heappop(_session_expiry_heap)
+        data = verified_sessions.get(token)
+        if data and data['expires'] == expires:
+            del verified_sessions[token]
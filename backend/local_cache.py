@@ -10,14 +10,17 @@ Architecture:
 - On startup, pulls latest data from Neon to local cache
 """
 
+import atexit
 import os
 import sqlite3
 import threading
 import time
 import psycopg
 from psycopg.rows import dict_row
+from collections import defaultdict
 from datetime import datetime
 from contextlib import contextmanager
+from functools import lru_cache
 
 # Configuration
 SYNC_INTERVAL_SECONDS = 3  # Sync to Neon every 3 seconds
@@ -28,14 +31,37 @@ DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql://neondb_owner:npg_0h1
 _pending_attendance = []  # List of (spreadsheet_id, ma, date, status, timestamp, session_id)
 _pending_sheets = []  # List of (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga)
 _pending_team_members = {}  # Dict of spreadsheet_id -> list of members
+_pending_deletions = []  # List of spreadsheet_ids deleted locally
+_pending_date_updates = []  # List of (start_date, end_date, timestamp, spreadsheet_id)
+_pending_version = None  # Latest data_version to upsert, or None
 _pending_lock = threading.Lock()
+
+# Wakes the sync loop early when the attendance backlog crosses the
+# threshold, so bursts flush sub-second instead of queueing for a full
+# sync interval
+_sync_trigger = threading.Event()
+SYNC_BACKLOG_THRESHOLD = 500
 _sync_thread = None
+_heartbeat_thread = None
 _sync_running = False
 
 # Persistent Neon connection for sync thread (avoids 0.4s connection overhead per sync)
 _neon_sync_conn = None
 _neon_conn_lock = threading.Lock()
 
+# Hot-path SQL kept as module constants so sqlite3's per-connection
+# statement cache always hits the same string
+_SQL_UPSERT_ATTENDANCE = '''
+    INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (spreadsheet_id, ma, date)
+    DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, updated_by_session = excluded.updated_by_session
+'''
+_SQL_INSERT_MEMBER = '''
+    INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
 # Initialization state (lazy init for gunicorn compatibility)
 _initialized = False
 _init_lock = threading.Lock()
@@ -44,13 +70,69 @@ _init_lock = threading.Lock()
 # Local SQLite Connection
 # ============================================
 
-def get_local_connection():
-    """Get a connection to local SQLite cache"""
+# One long-lived connection per thread (opening the db file on every call
+# costs several syscalls plus a page-cache warm-up)
+_tls = threading.local()
+_all_conns = []
+_all_conns_lock = threading.Lock()
+
+def _create_local_connection():
+    """Open a new connection to the local SQLite cache"""
     os.makedirs(os.path.dirname(LOCAL_DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(LOCAL_DB_PATH, check_same_thread=False)
+    # cached_statements: keep hot statements compiled now that connections
+    # live for the whole thread instead of one call
+    conn = sqlite3.connect(LOCAL_DB_PATH, check_same_thread=False, cached_statements=512)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed during writes and turns every commit into a
+    # sequential WAL append instead of a rollback-journal rewrite;
+    # synchronous=NORMAL drops the per-commit fsync, which is fine for a
+    # cache that is rebuilt from Neon on startup anyway
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-20000')
+    conn.execute('PRAGMA mmap_size=268435456')
+    # Checkpoint the WAL back into the main file every ~1000 pages so it
+    # can't grow unbounded under sustained writes
+    conn.execute('PRAGMA wal_autocheckpoint=1000')
+    # Wait instead of raising 'database is locked' when the sync thread and
+    # a request thread both hold the writer
+    conn.execute('PRAGMA busy_timeout=5000')
+    # Enforce the declared ON DELETE CASCADE constraints (off by default in
+    # SQLite) so delete_sheet can be a single statement
+    conn.execute('PRAGMA foreign_keys=ON')
     return conn
 
+def get_local_connection():
+    """Get this thread's connection to the local SQLite cache (kept open)"""
+    conn = getattr(_tls, 'conn', None)
+    if conn is not None:
+        try:
+            conn.execute('SELECT 1')
+            return conn
+        except sqlite3.ProgrammingError:
+            pass  # a caller closed it - fall through and reopen
+    conn = _create_local_connection()
+    _tls.conn = conn
+    with _all_conns_lock:
+        _all_conns.append(conn)
+    return conn
+
+def _close_all_connections():
+    """Close every cached connection at interpreter shutdown"""
+    with _all_conns_lock:
+        for conn in _all_conns:
+            try:
+                # Refresh planner statistics cheaply before closing, as the
+                # SQLite docs recommend for long-lived connections
+                conn.execute('PRAGMA optimize')
+                conn.close()
+            except Exception:
+                pass
+        _all_conns.clear()
+
+atexit.register(_close_all_connections)
+
 # Alias for backwards compatibility with app.py
 def get_db_connection():
     """Alias for get_local_connection - for backwards compatibility"""
@@ -58,13 +140,14 @@ def get_db_connection():
 
 @contextmanager
 def local_db():
-    """Context manager for local SQLite connection"""
+    """Context manager for local SQLite connection (connection stays open)"""
     conn = get_local_connection()
     try:
         yield conn
         conn.commit()
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
 
 # ============================================
 # Neon PostgreSQL Connection
@@ -78,9 +161,31 @@ def get_neon_sync_connection():
     """Get or reuse persistent connection for sync thread (much faster)"""
     global _neon_sync_conn
     with _neon_conn_lock:
+        if _neon_sync_conn is not None and not _neon_sync_conn.closed:
+            # Probe before handing it out: a dead socket discovered here
+            # costs one cheap query; discovered mid-batch it costs the
+            # whole batch plus a re-queue
+            try:
+                _neon_sync_conn.execute('SELECT 1')
+                _neon_sync_conn.commit()
+            except Exception as e:
+                print(f"[SYNC] Persistent connection failed probe, reconnecting: {e}")
+                try:
+                    _neon_sync_conn.close()
+                except:
+                    pass
+                _neon_sync_conn = None
         if _neon_sync_conn is None or _neon_sync_conn.closed:
             print("[SYNC] Creating persistent Neon connection...")
-            _neon_sync_conn = psycopg.connect(DATABASE_URL)
+            # TCP keepalives so NAT/load-balancer idle timeouts don't
+            # silently kill the connection between pushes
+            _neon_sync_conn = psycopg.connect(
+                DATABASE_URL,
+                keepalives=1,
+                keepalives_idle=30,
+                keepalives_interval=10,
+                keepalives_count=3
+            )
         return _neon_sync_conn
 
 def get_neon_dict_cursor(conn):
@@ -91,11 +196,20 @@ def get_neon_dict_cursor(conn):
 # Initialize Local Cache
 # ============================================
 
+# Bump whenever the schema below changes so existing cache files re-run init
+SCHEMA_VERSION = 3
+
 def init_local_cache():
     """Initialize local SQLite schema"""
     with local_db() as conn:
         cursor = conn.cursor()
 
+        # Schema already at the current version? Skip the CREATE/ALTER
+        # roundtrips entirely (this runs on every worker fork)
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] >= SCHEMA_VERSION:
+            return
+
         # Data version for sync
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS data_version (
@@ -138,7 +252,8 @@ def init_local_cache():
             )
         ''')
 
-        # Add notes column if it doesn't exist (migration for existing DBs)
+        # Add notes column if it doesn't exist (migration for cache files
+        # created before user_version tracking - only reached once)
         try:
             cursor.execute('ALTER TABLE team_members ADD COLUMN notes TEXT DEFAULT ""')
         except:
@@ -172,9 +287,21 @@ def init_local_cache():
 
         # Create indexes
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_spreadsheet ON attendance(spreadsheet_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_ma ON attendance(ma)')
+        # Serves the sync polling filter (spreadsheet_id, updated_at,
+        # exclude-session) and get_attendance's MAX(updated_at) probe
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_att_sheet_updated ON attendance(spreadsheet_id, updated_at, updated_by_session)')
+        # No query filters on ma alone (upserts go through the
+        # (spreadsheet_id, ma, date) unique constraint) - it only taxed writes
+        cursor.execute('DROP INDEX IF EXISTS idx_attendance_ma')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_team_members_spreadsheet ON team_members(spreadsheet_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_active_users_spreadsheet ON active_users(spreadsheet_id)')
+        # Range scan for the throttled cleanup DELETE instead of a table scan
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_active_users_last_seen ON active_users(last_seen)')
+        # Covering index: get_attendance reads (ma, date, status) per sheet
+        # without touching the table b-tree
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_covering ON attendance(spreadsheet_id, ma, date, status)')
+
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
 
     print("Local SQLite cache initialized")
 
@@ -187,7 +314,9 @@ def pull_from_neon():
     print("[SYNC] Pulling data from Neon to local cache...")
     try:
         neon_conn = get_neon_connection()
-        neon_cursor = get_neon_dict_cursor(neon_conn)
+        # Plain tuple cursor: the SELECTs below enumerate their columns in
+        # INSERT order, so dict rows would only add per-row overhead
+        neon_cursor = neon_conn.cursor()
 
         with local_db() as local_conn:
             local_cursor = local_conn.cursor()
@@ -198,53 +327,78 @@ def pull_from_neon():
             local_cursor.execute('DELETE FROM active_users')
             local_cursor.execute('DELETE FROM sheets')
 
-            # Pull sheets
-            neon_cursor.execute('SELECT * FROM sheets')
+            # Pull sheets - one executemany per table keeps the whole load
+            # in this single transaction with one prepare per statement.
+            # Explicit column lists keep the wire format pinned even if the
+            # Neon tables grow columns the cache doesn't mirror, and the
+            # COALESCEs preserve the old dict.get('', ...) defaults.
+            neon_cursor.execute('''
+                SELECT spreadsheet_id, COALESCE(spreadsheet_title, ''), COALESCE(sheet_name, ''),
+                       COALESCE(gdud, ''), COALESCE(pluga, ''),
+                       COALESCE(start_date, '2025-12-21'), COALESCE(end_date, '2026-02-01'),
+                       COALESCE(created_at, ''), COALESCE(updated_at, '')
+                FROM sheets
+            ''')
             sheets = neon_cursor.fetchall()
-            for sheet in sheets:
-                local_cursor.execute('''
-                    INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga, start_date, end_date, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    sheet['spreadsheet_id'], sheet.get('spreadsheet_title', ''), sheet.get('sheet_name', ''),
-                    sheet.get('gdud', ''), sheet.get('pluga', ''),
-                    sheet.get('start_date', '2025-12-21'), sheet.get('end_date', '2026-02-01'),
-                    sheet.get('created_at', ''), sheet.get('updated_at', '')
-                ))
+            local_cursor.executemany('''
+                INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga, start_date, end_date, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', sheets)
 
             # Pull team members
-            neon_cursor.execute('SELECT * FROM team_members')
+            neon_cursor.execute('''
+                SELECT spreadsheet_id, COALESCE(first_name, ''), COALESCE(last_name, ''),
+                       COALESCE(ma, ''), COALESCE(gdud, ''), COALESCE(pluga, ''),
+                       COALESCE(mahlaka, ''), COALESCE(miktzoa_tzvai, ''), COALESCE(notes, ''),
+                       COALESCE(created_at, '')
+                FROM team_members
+            ''')
             members = neon_cursor.fetchall()
-            for m in members:
-                local_cursor.execute('''
-                    INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    m['spreadsheet_id'], m.get('first_name', ''), m.get('last_name', ''),
-                    m.get('ma', ''), m.get('gdud', ''), m.get('pluga', ''),
-                    m.get('mahlaka', ''), m.get('miktzoa_tzvai', ''), m.get('notes', ''), m.get('created_at', '')
-                ))
-
-            # Pull attendance
-            neon_cursor.execute('SELECT * FROM attendance')
-            attendance = neon_cursor.fetchall()
-            for a in attendance:
-                local_cursor.execute('''
-                    INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    a['spreadsheet_id'], a['ma'], a['date'], a['status'],
-                    a.get('updated_at', ''), a.get('updated_by_session', '')
-                ))
+            local_cursor.executemany('''
+                INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', members)
+
+            # Pull attendance through a server-side cursor: rows stream from
+            # Neon in batches instead of fetchall materializing the whole
+            # table in memory before the first local insert
+            attendance_count = 0
+            with neon_conn.cursor(name='pull_attendance') as att_cursor:
+                att_cursor.itersize = 5000
+                att_cursor.execute('''
+                    SELECT spreadsheet_id, ma, date, status,
+                           COALESCE(updated_at, ''), COALESCE(updated_by_session, '')
+                    FROM attendance
+                ''')
+                while True:
+                    batch = att_cursor.fetchmany(5000)
+                    if not batch:
+                        break
+                    local_cursor.executemany('''
+                        INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', batch)
+                    attendance_count += len(batch)
 
             # Pull data version
             neon_cursor.execute('SELECT version FROM data_version WHERE id = 1')
             row = neon_cursor.fetchone()
             if row:
-                local_cursor.execute('UPDATE data_version SET version = ? WHERE id = 1', (row['version'],))
+                local_cursor.execute('UPDATE data_version SET version = ? WHERE id = 1', (row[0],))
 
         neon_conn.close()
-        print(f"[SYNC] Pulled {len(sheets)} sheets, {len(members)} members, {len(attendance)} attendance records")
+        # Table contents just changed wholesale - refresh planner stats
+        with local_db() as conn:
+            conn.execute('PRAGMA optimize')
+        # Everything was replaced wholesale - drop all memoized state
+        _build_attendance_dict.cache_clear()
+        with _sheet_known_lock:
+            _sheet_known.clear()
+        _invalidate_sheet_caches()
+        global _data_version_cache
+        with _data_version_lock:
+            _data_version_cache = None
+        print(f"[SYNC] Pulled {len(sheets)} sheets, {len(members)} members, {attendance_count} attendance records")
         return True
     except Exception as e:
         print(f"[SYNC ERROR] Failed to pull from Neon: {e}")
@@ -256,51 +410,81 @@ def pull_from_neon():
 
 def push_pending_to_neon():
     """Push all pending changes to Neon using persistent connection"""
-    global _pending_attendance, _pending_sheets, _pending_team_members, _neon_sync_conn
+    global _pending_attendance, _pending_sheets, _pending_team_members, \
+        _pending_deletions, _pending_date_updates, _pending_version, _neon_sync_conn
 
-    # Get all pending items
+    # Snapshot by swapping references - O(1) under the lock, so a large
+    # backlog never stalls the writers appending to these queues
     with _pending_lock:
-        pending_attendance = _pending_attendance.copy()
-        _pending_attendance = []
-        pending_sheets = _pending_sheets.copy()
-        _pending_sheets = []
-        pending_team_members = dict(_pending_team_members)
-        _pending_team_members = {}
-
-    if not pending_attendance and not pending_sheets and not pending_team_members:
+        pending_attendance, _pending_attendance = _pending_attendance, []
+        pending_sheets, _pending_sheets = _pending_sheets, []
+        pending_team_members, _pending_team_members = _pending_team_members, {}
+        pending_deletions, _pending_deletions = _pending_deletions, []
+        pending_date_updates, _pending_date_updates = _pending_date_updates, []
+        pending_version, _pending_version = _pending_version, None
+
+    if not (pending_attendance or pending_sheets or pending_team_members
+            or pending_deletions or pending_date_updates or pending_version is not None):
         return
 
+    # Coalesce repeated edits to the same cell: the upsert makes everything
+    # but the newest row a no-op, so only the last write per
+    # (spreadsheet_id, ma, date) needs to cross the wire. Dicts keep
+    # insertion order and later assignments overwrite, so the last append
+    # wins - exactly the intended semantics.
+    if pending_attendance:
+        dedup = {}
+        for row in pending_attendance:
+            dedup[(row[0], row[1], row[2])] = row
+        pending_attendance = list(dedup.values())
+
     try:
         # Use persistent connection (avoids 0.4s connection overhead)
         conn = get_neon_sync_connection()
         cursor = conn.cursor()
 
-        # Sync sheets first
+        # Deletions go first: delete_sheet purges the deleted sheet's other
+        # pending rows when it queues, so anything still queued for that
+        # sheet was written after the delete and must survive it
+        if pending_deletions:
+            cursor.executemany('DELETE FROM sheets WHERE spreadsheet_id = %s',
+                               [(sid,) for sid in pending_deletions])
+            print(f"[SYNC] Deleted {len(pending_deletions)} sheets from Neon")
+
+        # Sync sheets first - batched so psycopg pipelines the statements
+        # in one round trip instead of one per sheet
         if pending_sheets:
-            for sheet_data in pending_sheets:
-                cursor.execute('''
-                    INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (spreadsheet_id) DO UPDATE SET
-                        spreadsheet_title = EXCLUDED.spreadsheet_title,
-                        updated_at = CURRENT_TIMESTAMP
-                ''', sheet_data)
+            cursor.executemany('''
+                INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (spreadsheet_id) DO UPDATE SET
+                    spreadsheet_title = EXCLUDED.spreadsheet_title,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', pending_sheets)
             print(f"[SYNC] Pushed {len(pending_sheets)} sheets to Neon")
 
-        # Sync team members
+        # Sync team members: batch the deletes, then insert every member
+        # row across all sheets in a single executemany
         if pending_team_members:
-            for spreadsheet_id, members in pending_team_members.items():
-                cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = %s', (spreadsheet_id,))
-                for member in members:
-                    cursor.execute('''
-                        INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ''', (
-                        spreadsheet_id,
-                        member.get('firstName', ''), member.get('lastName', ''), member.get('ma', ''),
-                        member.get('gdud', ''), member.get('pluga', ''),
-                        member.get('mahlaka', ''), member.get('miktzoaTzvai', ''), member.get('notes', '')
-                    ))
+            cursor.executemany(
+                'DELETE FROM team_members WHERE spreadsheet_id = %s',
+                [(sid,) for sid in pending_team_members]
+            )
+            member_rows = [
+                (
+                    spreadsheet_id,
+                    member.get('firstName', ''), member.get('lastName', ''), member.get('ma', ''),
+                    member.get('gdud', ''), member.get('pluga', ''),
+                    member.get('mahlaka', ''), member.get('miktzoaTzvai', ''), member.get('notes', '')
+                )
+                for spreadsheet_id, members in pending_team_members.items()
+                for member in members
+            ]
+            if member_rows:
+                cursor.executemany('''
+                    INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''', member_rows)
             print(f"[SYNC] Pushed team members for {len(pending_team_members)} sheets to Neon")
 
         # Sync attendance
@@ -313,6 +497,19 @@ def push_pending_to_neon():
             ''', pending_attendance)
             print(f"[SYNC] Pushed {len(pending_attendance)} attendance records to Neon")
 
+        if pending_date_updates:
+            cursor.executemany(
+                'UPDATE sheets SET start_date = %s, end_date = %s, updated_at = %s WHERE spreadsheet_id = %s',
+                pending_date_updates
+            )
+            print(f"[SYNC] Pushed {len(pending_date_updates)} date updates to Neon")
+
+        if pending_version is not None:
+            cursor.execute('''
+                INSERT INTO data_version (id, version) VALUES (1, %s)
+                ON CONFLICT (id) DO UPDATE SET version = %s
+            ''', (pending_version, pending_version))
+
         conn.commit()
         # Don't close - keep connection open for reuse
     except Exception as e:
@@ -332,29 +529,101 @@ def push_pending_to_neon():
             for sid, members in pending_team_members.items():
                 if sid not in _pending_team_members:
                     _pending_team_members[sid] = members
+            _pending_deletions = pending_deletions + _pending_deletions
+            _pending_date_updates = pending_date_updates + _pending_date_updates
+            if _pending_version is None:
+                _pending_version = pending_version
+
+# Application-level liveness ping; push_pending_to_neon returns early when
+# nothing is pending, so the persistent connection can sit idle for long
+# stretches otherwise
+NEON_PING_INTERVAL_SECONDS = 30
+
+# Refresh SQLite planner statistics periodically on long-lived processes,
+# per the PRAGMA optimize guidance in the SQLite docs
+OPTIMIZE_INTERVAL_SECONDS = 900
+
+def _ping_neon():
+    """Run SELECT 1 on the persistent sync connection to keep it warm.
+
+    Only pings an existing connection - never opens one just to ping. A
+    failed ping drops the connection so the next push reconnects cleanly
+    instead of timing out mid-transaction.
+    """
+    global _neon_sync_conn
+    with _neon_conn_lock:
+        conn = _neon_sync_conn
+        if conn is None or conn.closed:
+            return
+        try:
+            conn.execute('SELECT 1')
+            conn.commit()
+        except Exception as e:
+            print(f"[SYNC] Keepalive ping failed, dropping connection: {e}")
+            try:
+                conn.close()
+            except:
+                pass
+            _neon_sync_conn = None
 
 def _sync_loop():
     """Background sync loop"""
     global _sync_running
+    last_ping = time.time()
+    last_optimize = time.time()
     while _sync_running:
-        time.sleep(SYNC_INTERVAL_SECONDS)
+        # Normally ticks every SYNC_INTERVAL_SECONDS; a backlog burst sets
+        # the trigger and wakes the loop immediately
+        _sync_trigger.wait(SYNC_INTERVAL_SECONDS)
+        _sync_trigger.clear()
         if _sync_running:
             push_pending_to_neon()
+            # Sweep expired presence rows off the read path; the function
+            # throttles itself to CLEANUP_INTERVAL_SECONDS
+            try:
+                cleanup_inactive_users()
+            except Exception as e:
+                print(f"[SYNC] Presence cleanup error: {e}")
+            now = time.time()
+            if now - last_ping >= NEON_PING_INTERVAL_SECONDS:
+                _ping_neon()
+                last_ping = now
+            if now - last_optimize >= OPTIMIZE_INTERVAL_SECONDS:
+                try:
+                    with local_db() as conn:
+                        conn.execute('PRAGMA optimize')
+                except Exception as e:
+                    print(f"[SYNC] PRAGMA optimize error: {e}")
+                last_optimize = now
+
+def _heartbeat_loop():
+    """Background loop flushing coalesced presence heartbeats"""
+    while _sync_running:
+        time.sleep(HEARTBEAT_FLUSH_SECONDS)
+        if _sync_running:
+            try:
+                flush_heartbeats()
+            except Exception as e:
+                print(f"[HEARTBEAT] Flush error: {e}")
 
 def start_sync_thread():
-    """Start the background sync thread"""
-    global _sync_thread, _sync_running
+    """Start the background sync threads"""
+    global _sync_thread, _heartbeat_thread, _sync_running
     if _sync_thread is None or not _sync_thread.is_alive():
         _sync_running = True
         _sync_thread = threading.Thread(target=_sync_loop, daemon=True)
         _sync_thread.start()
+        _heartbeat_thread = threading.Thread(target=_heartbeat_loop, daemon=True)
+        _heartbeat_thread.start()
         print(f"[SYNC] Background sync started (every {SYNC_INTERVAL_SECONDS}s)")
 
 def stop_sync_thread():
     """Stop the background sync thread"""
     global _sync_running, _neon_sync_conn
     _sync_running = False
+    _sync_trigger.set()  # wake the loop so it notices the stop promptly
     # Push any remaining changes
+    flush_heartbeats()
     push_pending_to_neon()
     # Close persistent connection
     with _neon_conn_lock:
@@ -369,14 +638,26 @@ def stop_sync_thread():
 # Database API (uses local cache)
 # ============================================
 
+# Every client polls the data version for change detection, but it only
+# moves through increment_data_version (or a wholesale pull), so serve it
+# from memory after the first read
+_data_version_cache = None
+_data_version_lock = threading.Lock()
+
 def get_data_version():
-    """Get the current data version number"""
+    """Get the current data version number (cached in memory)"""
+    global _data_version_cache
+    cached = _data_version_cache
+    if cached is not None:
+        return cached
     try:
         with local_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT version FROM data_version WHERE id = 1")
             row = cursor.fetchone()
             if row:
+                with _data_version_lock:
+                    _data_version_cache = row['version']
                 return row['version']
     except Exception as e:
         print(f"get_data_version error: {e}")
@@ -391,18 +672,14 @@ def increment_data_version():
         row = cursor.fetchone()
         new_version = row['version'] if row else 2
 
-    # Also update Neon
-    try:
-        neon_conn = get_neon_connection()
-        neon_cursor = neon_conn.cursor()
-        neon_cursor.execute("""
-            INSERT INTO data_version (id, version) VALUES (1, %s)
-            ON CONFLICT (id) DO UPDATE SET version = %s
-        """, (new_version, new_version))
-        neon_conn.commit()
-        neon_conn.close()
-    except Exception as e:
-        print(f"increment_data_version Neon sync error: {e}")
+    global _data_version_cache
+    with _data_version_lock:
+        _data_version_cache = new_version
+
+    # Queue for Neon sync; versions are monotonic so the newest wins
+    global _pending_version
+    with _pending_lock:
+        _pending_version = new_version
 
     print(f"Data version incremented to: {new_version}")
     return new_version
@@ -411,22 +688,45 @@ def get_server_timestamp():
     """Get current server timestamp"""
     return datetime.now().isoformat()
 
+# Sheet rows are stable for the life of the process, so the lookup helpers
+# below are memoized; every sheet write goes through _invalidate_sheet_caches
+_sheet_known = set()  # spreadsheet_ids confirmed present locally
+_sheet_known_lock = threading.Lock()
+
+def _invalidate_sheet_caches():
+    """Clear memoized sheet lookups after any sheet write"""
+    get_sheet_by_id.cache_clear()
+    get_all_sheets.cache_clear()
+
 def get_or_create_sheet(spreadsheet_id, sheet_name='', gdud='', pluga='', spreadsheet_title=''):
     """Get or create sheet in local cache (Neon sync happens in background)"""
+    # Fast path: sheet already confirmed and no title to refresh - skip the
+    # SELECT entirely (this runs on every sheet load)
+    with _sheet_known_lock:
+        if spreadsheet_id in _sheet_known and not spreadsheet_title:
+            return spreadsheet_id
+
+    # Single upsert instead of SELECT + INSERT/UPDATE branches; the CASEs
+    # keep the old semantics on conflict - the title only overwrites when
+    # the caller actually passed one, and updated_at only moves with it
     with local_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT spreadsheet_id FROM sheets WHERE spreadsheet_id = ?', (spreadsheet_id,))
-        row = cursor.fetchone()
-
-        if row:
-            if spreadsheet_title:
-                cursor.execute('UPDATE sheets SET spreadsheet_title = ?, updated_at = ? WHERE spreadsheet_id = ?',
-                              (spreadsheet_title, datetime.now().isoformat(), spreadsheet_id))
-        else:
-            cursor.execute('''
-                INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga))
+        conn.execute('''
+            INSERT INTO sheets (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (spreadsheet_id) DO UPDATE SET
+                spreadsheet_title = CASE WHEN excluded.spreadsheet_title != ''
+                                         THEN excluded.spreadsheet_title
+                                         ELSE sheets.spreadsheet_title END,
+                updated_at = CASE WHEN excluded.spreadsheet_title != ''
+                                  THEN ? ELSE sheets.updated_at END
+        ''', (spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga,
+              datetime.now().isoformat()))
+
+    with _sheet_known_lock:
+        _sheet_known.add(spreadsheet_id)
+    # Rarely reached (the fast path above covers repeat calls), so an
+    # unconditional invalidation is fine
+    _invalidate_sheet_caches()
 
     # Queue for background Neon sync (no blocking!)
     with _pending_lock:
@@ -434,6 +734,7 @@ def get_or_create_sheet(spreadsheet_id, sheet_name='', gdud='', pluga='', spread
 
     return spreadsheet_id
 
+@lru_cache(maxsize=256)
 def get_sheet_by_id(spreadsheet_id):
     """Get sheet info from local cache"""
     with local_db() as conn:
@@ -444,6 +745,12 @@ def get_sheet_by_id(spreadsheet_id):
             return dict(row)
     return None
 
+# Result-dict keys for the streaming list builders below (zip with the SELECT
+# column order, avoiding a Row list plus per-row key lookups)
+_SHEET_KEYS = ('spreadsheet_id', 'spreadsheet_title', 'sheet_name', 'gdud', 'pluga', 'start_date', 'end_date', 'created_at')
+_MEMBER_KEYS = ('firstName', 'lastName', 'ma', 'gdud', 'pluga', 'mahlaka', 'miktzoaTzvai')
+
+@lru_cache(maxsize=1)
 def get_all_sheets():
     """Get all sheets from local cache"""
     with local_db() as conn:
@@ -452,42 +759,37 @@ def get_all_sheets():
             SELECT spreadsheet_id, spreadsheet_title, sheet_name, gdud, pluga, start_date, end_date, created_at
             FROM sheets ORDER BY created_at DESC
         ''')
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+        return [dict(zip(_SHEET_KEYS, row)) for row in cursor]
 
 def update_sheet_dates(spreadsheet_id, start_date, end_date):
     """Update date range in local cache"""
+    timestamp = datetime.now().isoformat()
     with local_db() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE sheets SET start_date = ?, end_date = ?, updated_at = ? WHERE spreadsheet_id = ?',
-                      (start_date, end_date, datetime.now().isoformat(), spreadsheet_id))
+                      (start_date, end_date, timestamp, spreadsheet_id))
 
-    # Sync to Neon
-    try:
-        neon_conn = get_neon_connection()
-        neon_cursor = neon_conn.cursor()
-        neon_cursor.execute('UPDATE sheets SET start_date = %s, end_date = %s, updated_at = %s WHERE spreadsheet_id = %s',
-                           (start_date, end_date, datetime.now().isoformat(), spreadsheet_id))
-        neon_conn.commit()
-        neon_conn.close()
-    except Exception as e:
-        print(f"update_sheet_dates Neon sync error: {e}")
+    _invalidate_sheet_caches()
+
+    # Queue for Neon sync (same timestamp as the local write)
+    with _pending_lock:
+        _pending_date_updates.append((start_date, end_date, timestamp, spreadsheet_id))
 
 def save_team_members(spreadsheet_id, members):
     """Save team members to local cache (Neon sync happens in background)"""
     with local_db() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = ?', (spreadsheet_id,))
-        for member in members:
-            cursor.execute('''
-                INSERT INTO team_members (spreadsheet_id, first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        rows = [
+            (
                 spreadsheet_id,
                 member.get('firstName', ''), member.get('lastName', ''), member.get('ma', ''),
                 member.get('gdud', ''), member.get('pluga', ''),
                 member.get('mahlaka', ''), member.get('miktzoaTzvai', ''), member.get('notes', '')
-            ))
+            )
+            for member in members
+        ]
+        cursor.executemany(_SQL_INSERT_MEMBER, rows)
 
     # Queue for background Neon sync (no blocking!)
     with _pending_lock:
@@ -498,23 +800,43 @@ def get_team_members(spreadsheet_id):
     with local_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai
+            SELECT first_name, last_name, ma, gdud, pluga, mahlaka, COALESCE(miktzoa_tzvai, '')
             FROM team_members WHERE spreadsheet_id = ?
         ''', (spreadsheet_id,))
-        rows = cursor.fetchall()
-
-        members = []
-        for row in rows:
-            members.append({
-                'firstName': row['first_name'],
-                'lastName': row['last_name'],
-                'ma': row['ma'],
-                'gdud': row['gdud'],
-                'pluga': row['pluga'],
-                'mahlaka': row['mahlaka'],
-                'miktzoaTzvai': row['miktzoa_tzvai'] or ''
-            })
-        return members
+        return [dict(zip(_MEMBER_KEYS, row)) for row in cursor]
+
+# In-process change notification: pollers can block on wait_for_changes
+# instead of re-querying an idle sheet. Per-worker only - a write in one
+# gunicorn worker doesn't wake pollers in another, which is why the HTTP
+# layer should keep a timeout and re-check on wakeup.
+_change_cond = threading.Condition()
+_change_versions = defaultdict(int)
+
+def _signal_change(spreadsheet_id):
+    """Bump a sheet's change version and wake any blocked pollers"""
+    with _change_cond:
+        _change_versions[spreadsheet_id] += 1
+        _change_cond.notify_all()
+
+def get_change_version(spreadsheet_id):
+    """Current change version for a sheet (0 if never written this process)"""
+    with _change_cond:
+        return _change_versions[spreadsheet_id]
+
+def wait_for_changes(spreadsheet_id, last_version, timeout=25.0):
+    """Block until the sheet's change version advances past last_version.
+
+    Returns the current version; on timeout that equals last_version, so
+    callers can skip the changes query entirely.
+    """
+    deadline = time.time() + timeout
+    with _change_cond:
+        while _change_versions[spreadsheet_id] <= last_version:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            _change_cond.wait(remaining)
+        return _change_versions[spreadsheet_id]
 
 def update_attendance(spreadsheet_id, ma, date, status, session_id=''):
     """Update attendance in local cache and queue for Neon sync"""
@@ -523,17 +845,15 @@ def update_attendance(spreadsheet_id, ma, date, status, session_id=''):
     # Update local cache immediately
     with local_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT (spreadsheet_id, ma, date)
-            DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, updated_by_session = excluded.updated_by_session
-        ''', (spreadsheet_id, ma, date, status, timestamp, session_id))
+        cursor.execute(_SQL_UPSERT_ATTENDANCE, (spreadsheet_id, ma, date, status, timestamp, session_id))
 
     # Queue for Neon sync
     with _pending_lock:
         _pending_attendance.append((spreadsheet_id, ma, date, status, timestamp, session_id))
+        if len(_pending_attendance) >= SYNC_BACKLOG_THRESHOLD:
+            _sync_trigger.set()
 
+    _signal_change(spreadsheet_id)
     print(f"[LOCAL] Saved attendance: ma={ma}, date={date}, status={status}")
 
 def update_attendance_batch(spreadsheet_id, updates, session_id=''):
@@ -543,38 +863,58 @@ def update_attendance_batch(spreadsheet_id, updates, session_id=''):
 
     timestamp = datetime.now().isoformat()
 
-    # Update local cache
+    rows = [(spreadsheet_id, u['ma'], u['date'], u['status'], timestamp, session_id) for u in updates]
+
+    # Update local cache - one prepare for the whole batch
     with local_db() as conn:
-        cursor = conn.cursor()
-        for u in updates:
-            cursor.execute('''
-                INSERT INTO attendance (spreadsheet_id, ma, date, status, updated_at, updated_by_session)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT (spreadsheet_id, ma, date)
-                DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, updated_by_session = excluded.updated_by_session
-            ''', (spreadsheet_id, u['ma'], u['date'], u['status'], timestamp, session_id))
+        conn.cursor().executemany(_SQL_UPSERT_ATTENDANCE, rows)
 
     # Queue for Neon sync
     with _pending_lock:
-        for u in updates:
-            _pending_attendance.append((spreadsheet_id, u['ma'], u['date'], u['status'], timestamp, session_id))
+        _pending_attendance.extend(rows)
+        if len(_pending_attendance) >= SYNC_BACKLOG_THRESHOLD:
+            _sync_trigger.set()
 
+    _signal_change(spreadsheet_id)
     print(f"[LOCAL] Batch saved {len(updates)} attendance records")
 
 def get_attendance(spreadsheet_id):
-    """Get attendance from local cache"""
+    """Get attendance from local cache (memoized until the sheet changes)"""
+    with local_db() as conn:
+        cursor = conn.cursor()
+        # Cheap index-only probe: any write bumps MAX(updated_at), which
+        # changes the cache key below and invalidates the memoized dict
+        cursor.execute('SELECT MAX(updated_at) FROM attendance WHERE spreadsheet_id = ?', (spreadsheet_id,))
+        max_ts = cursor.fetchone()[0]
+    return _build_attendance_dict(spreadsheet_id, max_ts)
+
+@lru_cache(maxsize=128)
+def _build_attendance_dict(spreadsheet_id, max_ts):
+    """Build the nested {ma: {date: status}} dict for a sheet"""
     with local_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT ma, date, status FROM attendance WHERE spreadsheet_id = ?', (spreadsheet_id,))
-        rows = cursor.fetchall()
 
-        attendance_data = {}
-        for row in rows:
-            ma = row['ma']
-            if ma not in attendance_data:
-                attendance_data[ma] = {}
-            attendance_data[ma][row['date']] = row['status']
-        return attendance_data
+        # defaultdict creates the inner dicts in C; iterating the cursor
+        # avoids materializing a Row list first
+        attendance_data = defaultdict(dict)
+        for ma, date, status in cursor:
+            attendance_data[ma][date] = status
+        return dict(attendance_data)
+
+def get_attendance_columns(spreadsheet_id):
+    """Get attendance as parallel columns: {'ma': [...], 'date': [...], 'status': [...]}.
+
+    Column form serializes smaller than the nested dict (no repeated key
+    strings per member) and builds in one zip pass - suited to dashboard/
+    export callers that don't need per-member lookup.
+    """
+    with local_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT ma, date, status FROM attendance WHERE spreadsheet_id = ?', (spreadsheet_id,))
+        rows = cursor.fetchall()
+        mas, dates, statuses = zip(*rows) if rows else ((), (), ())
+        return {'ma': list(mas), 'date': list(dates), 'status': list(statuses)}
 
 def get_full_sheet_data(spreadsheet_id):
     """Get full sheet data from local cache - very fast!"""
@@ -590,134 +930,144 @@ def get_full_sheet_data(spreadsheet_id):
         if not sheet:
             return None, [], {}
 
-        # Get team members
+        # Get team members (init guarantees the notes column exists, so the
+        # per-row 'notes' in row.keys() probe is gone)
         cursor.execute('''
-            SELECT first_name, last_name, ma, gdud, pluga, mahlaka, miktzoa_tzvai, notes
+            SELECT first_name, last_name, ma, gdud, pluga, mahlaka, COALESCE(miktzoa_tzvai, ''), COALESCE(notes, '')
             FROM team_members WHERE spreadsheet_id = ?
         ''', (spreadsheet_id,))
-        member_rows = cursor.fetchall()
-
-        members = []
-        for row in member_rows:
-            members.append({
-                'firstName': row['first_name'],
-                'lastName': row['last_name'],
-                'ma': row['ma'],
-                'gdud': row['gdud'],
-                'pluga': row['pluga'],
-                'mahlaka': row['mahlaka'],
-                'miktzoaTzvai': row['miktzoa_tzvai'] or '',
-                'notes': row['notes'] or '' if 'notes' in row.keys() else ''
-            })
+        members = [dict(zip(_MEMBER_KEYS + ('notes',), row)) for row in cursor]
 
         # Get attendance
         cursor.execute('SELECT ma, date, status FROM attendance WHERE spreadsheet_id = ?', (spreadsheet_id,))
-        attendance_rows = cursor.fetchall()
 
-        attendance_data = {}
-        for row in attendance_rows:
-            ma = row['ma']
-            if ma not in attendance_data:
-                attendance_data[ma] = {}
-            attendance_data[ma][row['date']] = row['status']
+        attendance_data = defaultdict(dict)
+        for ma, date, status in cursor:
+            attendance_data[ma][date] = status
 
-        return sheet, members, attendance_data
+        return sheet, members, dict(attendance_data)
 
 def get_attendance_changes_since(spreadsheet_id, since_timestamp, exclude_session_id=''):
     """Get attendance changes since a timestamp"""
     with local_db() as conn:
         cursor = conn.cursor()
 
-        if exclude_session_id:
-            cursor.execute('''
-                SELECT ma, date, status, updated_at, updated_by_session FROM attendance
-                WHERE spreadsheet_id = ? AND updated_at > ?
-                AND updated_by_session IS NOT NULL
-                AND updated_by_session != ''
-                AND updated_by_session != ?
-            ''', (spreadsheet_id, since_timestamp, exclude_session_id))
-        else:
-            cursor.execute('''
-                SELECT ma, date, status, updated_at FROM attendance
-                WHERE spreadsheet_id = ? AND updated_at > ?
-            ''', (spreadsheet_id, since_timestamp))
-
-        rows = cursor.fetchall()
-
-        changes = []
-        for row in rows:
-            changes.append({
-                'ma': row['ma'],
-                'date': row['date'],
-                'status': row['status'],
-                'updated_at': row['updated_at']
-            })
-        return changes
+        # One statement for both cases so the statement cache holds a single
+        # plan: with no exclusion the parameterized '' short-circuits the
+        # session guards, and the seek stays on idx_att_sheet_updated, whose
+        # third column also feeds the residual session filter
+        cursor.execute('''
+            SELECT ma, date, status, updated_at FROM attendance
+            WHERE spreadsheet_id = ? AND updated_at > ?
+            AND (? = '' OR (updated_by_session IS NOT NULL
+                            AND updated_by_session != ''
+                            AND updated_by_session != ?))
+        ''', (spreadsheet_id, since_timestamp, exclude_session_id, exclude_session_id))
+
+        return [
+            {'ma': ma, 'date': date, 'status': status, 'updated_at': updated_at}
+            for ma, date, status, updated_at in cursor
+        ]
 
 def delete_sheet(spreadsheet_id):
     """Delete a sheet from local cache and Neon"""
     with local_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM attendance WHERE spreadsheet_id = ?', (spreadsheet_id,))
-        cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = ?', (spreadsheet_id,))
-        cursor.execute('DELETE FROM active_users WHERE spreadsheet_id = ?', (spreadsheet_id,))
+        # Child rows cascade (foreign_keys=ON is set per connection)
         cursor.execute('DELETE FROM sheets WHERE spreadsheet_id = ?', (spreadsheet_id,))
 
-    # Sync to Neon
-    try:
-        neon_conn = get_neon_connection()
-        neon_cursor = neon_conn.cursor()
-        neon_cursor.execute('DELETE FROM attendance WHERE spreadsheet_id = %s', (spreadsheet_id,))
-        neon_cursor.execute('DELETE FROM team_members WHERE spreadsheet_id = %s', (spreadsheet_id,))
-        neon_cursor.execute('DELETE FROM active_users WHERE spreadsheet_id = %s', (spreadsheet_id,))
-        neon_cursor.execute('DELETE FROM sheets WHERE spreadsheet_id = %s', (spreadsheet_id,))
-        neon_conn.commit()
-        neon_conn.close()
-    except Exception as e:
-        print(f"delete_sheet Neon sync error: {e}")
+    _build_attendance_dict.cache_clear()
+    with _sheet_known_lock:
+        _sheet_known.discard(spreadsheet_id)
+    _invalidate_sheet_caches()
+
+    # Queue the Neon delete for the sync thread instead of opening a
+    # connection on the request path; drop any still-pending writes for the
+    # sheet so the push can't re-create rows the cascade just removed
+    global _pending_attendance, _pending_sheets, _pending_date_updates
+    with _pending_lock:
+        _pending_attendance = [r for r in _pending_attendance if r[0] != spreadsheet_id]
+        _pending_sheets = [s for s in _pending_sheets if s[0] != spreadsheet_id]
+        _pending_team_members.pop(spreadsheet_id, None)
+        _pending_date_updates = [u for u in _pending_date_updates if u[3] != spreadsheet_id]
+        _pending_deletions.append(spreadsheet_id)
 
 # ============================================
 # Active Users (local only for speed)
 # ============================================
 
 ACTIVE_USER_TIMEOUT_SECONDS = 30
+CLEANUP_INTERVAL_SECONDS = 10
+HEARTBEAT_FLUSH_SECONDS = 1.0
+
+# Throttle state for cleanup_inactive_users
+_last_cleanup = 0.0
+_cleanup_lock = threading.Lock()
+
+# Heartbeats are coalesced in memory and flushed once per second - one
+# transaction for all clients instead of one fsync per heartbeat
+_pending_heartbeats = {}  # session_id -> (email, spreadsheet_id, last_seen)
+_heartbeat_lock = threading.Lock()
 
 def update_active_user(session_id, email, spreadsheet_id, last_seen):
-    """Update active user in local cache"""
+    """Record a heartbeat (coalesced; flushed to SQLite by the sync thread)"""
+    with _heartbeat_lock:
+        _pending_heartbeats[session_id] = (email, spreadsheet_id, last_seen)
+
+def flush_heartbeats():
+    """Write all coalesced heartbeats in one transaction"""
+    global _pending_heartbeats
+    with _heartbeat_lock:
+        if not _pending_heartbeats:
+            return
+        # Reference swap keeps the lock hold O(1)
+        pending, _pending_heartbeats = _pending_heartbeats, {}
+
+    rows = [(sid, email, sheet_id, ts) for sid, (email, sheet_id, ts) in pending.items()]
     with local_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
+        cursor.executemany('''
             INSERT INTO active_users (session_id, email, spreadsheet_id, last_seen)
             VALUES (?, ?, ?, ?)
             ON CONFLICT (session_id) DO UPDATE SET email = excluded.email, spreadsheet_id = excluded.spreadsheet_id, last_seen = excluded.last_seen
-        ''', (session_id, email, spreadsheet_id, last_seen))
+        ''', rows)
 
 def cleanup_inactive_users():
-    """Remove inactive users"""
-    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
+    """Remove inactive users (throttled - every poller calls this)"""
+    global _last_cleanup
+    now = time.time()
+    with _cleanup_lock:
+        if now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+            return
+        _last_cleanup = now
+    cutoff = now - ACTIVE_USER_TIMEOUT_SECONDS
     with local_db() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM active_users WHERE last_seen < ?', (cutoff,))
 
 def get_active_users_for_sheet(spreadsheet_id, exclude_session=None):
     """Get active users for a sheet"""
-    cleanup_inactive_users()
+    # Filter on last_seen: the sweep runs in the sync loop, so expired rows
+    # can linger for up to CLEANUP_INTERVAL_SECONDS
+    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
     with local_db() as conn:
         cursor = conn.cursor()
         if exclude_session:
-            cursor.execute('SELECT email FROM active_users WHERE spreadsheet_id = ? AND session_id != ?',
-                          (spreadsheet_id, exclude_session))
+            cursor.execute('SELECT email FROM active_users WHERE spreadsheet_id = ? AND last_seen >= ? AND session_id != ?',
+                          (spreadsheet_id, cutoff, exclude_session))
         else:
-            cursor.execute('SELECT email FROM active_users WHERE spreadsheet_id = ?', (spreadsheet_id,))
+            cursor.execute('SELECT email FROM active_users WHERE spreadsheet_id = ? AND last_seen >= ?',
+                          (spreadsheet_id, cutoff))
         rows = cursor.fetchall()
         return [row['email'] for row in rows]
 
 def get_all_active_users_for_sheet(spreadsheet_id):
     """Get all active users"""
-    cleanup_inactive_users()
+    cutoff = time.time() - ACTIVE_USER_TIMEOUT_SECONDS
     with local_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT email FROM active_users WHERE spreadsheet_id = ?', (spreadsheet_id,))
+        cursor.execute('SELECT email FROM active_users WHERE spreadsheet_id = ? AND last_seen >= ?',
+                      (spreadsheet_id, cutoff))
         rows = cursor.fetchall()
         return [row['email'] for row in rows]
 
@@ -753,6 +1103,45 @@ def force_sync_now():
 # Startup
 # ============================================
 
+# Workers share one SQLite file, so only one of them needs to do the
+# startup pull; the rest just open the already-populated cache
+PULL_LOCK_PATH = LOCAL_DB_PATH + '.pull_lock'
+PULL_FRESHNESS_SECONDS = 60
+
+def _pull_once_across_workers():
+    """Run pull_from_neon in exactly one worker process.
+
+    The first worker to take the file lock pulls and stamps the lock file;
+    the others block on the lock, see the fresh stamp, and skip their own
+    pull - N gunicorn workers cost Neon one full-table read instead of N.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # Non-POSIX dev machine: no cross-process locking, just pull
+        pull_from_neon()
+        return
+
+    os.makedirs(os.path.dirname(PULL_LOCK_PATH), exist_ok=True)
+    with open(PULL_LOCK_PATH, 'a+') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            lock_file.seek(0)
+            stamp = lock_file.read().strip()
+            if stamp:
+                try:
+                    if time.time() - float(stamp) < PULL_FRESHNESS_SECONDS:
+                        print("[SYNC] Cache freshly pulled by another worker - skipping pull")
+                        return
+                except ValueError:
+                    pass  # unreadable stamp - pull anyway
+            if pull_from_neon():
+                lock_file.seek(0)
+                lock_file.truncate()
+                lock_file.write(str(time.time()))
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 def ensure_initialized():
     """Lazy initialization - call this before any operation.
     This is needed for gunicorn compatibility where threads don't survive fork."""
@@ -763,7 +1152,7 @@ def ensure_initialized():
         if _initialized:
             return
         init_local_cache()
-        pull_from_neon()
+        _pull_once_across_workers()
         start_sync_thread()
         _initialized = True
         print("[LOCAL CACHE] Initialized with Neon sync (lazy)")